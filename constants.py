@@ -48,6 +48,15 @@ COLOR_DS_75p = '#AB47BC'
 COLOR_DS_99p = '#7B1FA2'
 COLOR_DS_100p = '#4A148C'
 
+# data source coverage (percentage) upper bounds, inclusive, and the color/visibility score that belongs to each bucket
+DS_COVERAGE_COLOR_THRESHOLDS = [25, 50, 75, 99]
+DS_COVERAGE_COLORS = [COLOR_DS_25p, COLOR_DS_50p, COLOR_DS_75p, COLOR_DS_99p, COLOR_DS_100p]
+DS_COVERAGE_VISIBILITY_THRESHOLDS = [49, 74, 99]
+DS_COVERAGE_VISIBILITY_SCORES = [1, 2, 3, 4]
+
+# weight per data quality dimension in the calculation of the data quality score (dimensions not listed have a weight of 1)
+DATA_QUALITY_WEIGHTS = {'device_completeness': 2, 'data_field_completeness': 2, 'retention': 2}
+
 # data source colors HAPPY (green range)
 COLOR_DS_25p_HAPPY = '#DCEDC8'
 COLOR_DS_50p_HAPPY = '#AED581'
@@ -143,6 +152,8 @@ REGEX_YAML_INDENT_CHARS = re.compile(r'(^[\s-]+).*', re.IGNORECASE)
 REGEX_YAML_VALID_DATE = re.compile(r'([12]\d{3}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01]))', re.IGNORECASE)
 REGEX_YAML_DATE = re.compile(r'^[\s-]+date:.*$', re.IGNORECASE)
 REGEX_YAML_TECHNIQUE_ID_GROUP = re.compile(r'^-\s+technique_id:\s+(T\d{4})\s*$', re.IGNORECASE)
+REGEX_YES_NO = re.compile(r'^(y|yes|n|no)$', re.IGNORECASE)
+REGEX_YES = re.compile(r'^(y|yes)$', re.IGNORECASE)
 
 # YAML objects
 YAML_OBJ_VISIBILITY = {'applicable_to': ['all'],
@@ -179,6 +190,18 @@ EQL_INVALID_RESULT_TECH = '[!] Invalid technique administration content. Check y
 HEALTH_ERROR_TXT = '[!] The below YAML file contains possible errors. It\'s recommended to check via the ' \
                    '\'--health\' argument: \n    - '
 
+# Health: cache file with the last modified time and error state per YAML file
+HEALTH_CACHE_FILE = 'cache/health-index.json'
+
+# Health: required key-value pairs in the YAML objects
+HEALTH_REQUIRED_KEYS_SCORE_OBJ = frozenset(['date', 'score', 'comment'])
+# Health: valid score range (min, max) per score object type
+HEALTH_SCORE_RANGE = {'detection': (-1, 5), 'visibility': (0, 4)}
+HEALTH_REQUIRED_KEYS_TECHNIQUE_OBJ = {'detection': frozenset(['applicable_to', 'comment', 'score_logbook', 'location']),
+                                      'visibility': frozenset(['applicable_to', 'comment', 'score_logbook'])}
+HEALTH_REQUIRED_KEYS_DATA_SOURCE_OBJ = frozenset(['applicable_to', 'date_registered', 'date_connected', 'products',
+                                                  'available_for_data_analytics', 'comment', 'data_quality'])
+
 PLATFORMS_ENTERPRISE = {'pre': 'PRE', 'windows': 'Windows', 'macos': 'macOS', 'linux': 'Linux', 'office 365': 'Office 365',
                         'azure ad': 'Azure AD', 'google workspace': 'Google Workspace', 'iaas': 'IaaS', 'saas': 'SaaS',
                         'network': 'Network', 'containers': 'Containers'}
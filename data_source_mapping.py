@@ -1,12 +1,13 @@
 import xlsxwriter
-import simplejson
+from bisect import bisect_left
+from collections import Counter, defaultdict
 from copy import deepcopy
-from datetime import datetime
-from itertools import chain
+from datetime import date
+from itertools import accumulate, chain
 from generic import *
 from file_output import *
 from navigator_layer import *
-# Imports for pandas and plotly are because of performance reasons in the function that uses these libraries.
+# Imports for plotly are because of performance reasons in the function that uses this library.
 
 
 def _count_applicable_data_sources(technique, applicable_data_sources, applicable_dettect_data_sources):
@@ -14,21 +15,12 @@ def _count_applicable_data_sources(technique, applicable_data_sources, applicabl
     get the count of applicable (DeTT&CT) data sources for the provided technique.
     This takes into account which data sources are applicable for a platform(s).
     :param technique: ATT&CK CTI technique object
-    :param applicable_data_sources: a list of applicable ATT&CK data sources
-    :param applicable_dettect_data_sources: a list of applicable DeTT&CT data sources
+    :param applicable_data_sources: a set of applicable ATT&CK data sources
+    :param applicable_dettect_data_sources: a set of applicable DeTT&CT data sources
     :return: a count of the applicable data sources for this technique
     """
-    applicable_ds_count = 0
-
-    for ds in technique['data_components']:
-        if ds in applicable_data_sources:
-            applicable_ds_count += 1
-
-    for ds in technique['dettect_data_sources']:
-        if ds in applicable_dettect_data_sources:
-            applicable_ds_count += 1
-
-    return applicable_ds_count
+    return len(applicable_data_sources.intersection(technique['data_components'])) + \
+        len(applicable_dettect_data_sources.intersection(technique['dettect_data_sources']))
 
 
 def _system_in_data_source_details_object(data_source, system):
@@ -44,6 +36,32 @@ def _system_in_data_source_details_object(data_source, system):
     return False
 
 
+def _get_systems_data_sources(my_ds, systems, domain):
+    """
+    Determine per system the ATT&CK platforms, the applicable ATT&CK and DeTT&CT data sources, and which of these
+    applicable data sources are available for the system. These only depend on the system, and can therefore be
+    determined once instead of for every technique.
+    :param my_ds: the configured data sources
+    :param systems: the systems YAML object from the data source file
+    :param domain: the specified domain
+    :return: a list of dictionaries (one per system) with the keys: system, platforms, applicable_data_sources,
+    applicable_dettect_data_sources, available_data_sources and available_dettect_data_sources
+    """
+    systems_data_sources = []
+    for system in systems:
+        applicable_data_sources = set(get_applicable_data_sources_platform(system['platform'], domain))
+        applicable_dettect_data_sources = set(get_applicable_dettect_data_sources_platform(system['platform'], domain))
+        available_for_system = {ds for ds in my_ds if _system_in_data_source_details_object(my_ds[ds], system)}
+
+        systems_data_sources.append({'system': system,
+                                     'platforms': set(system['platform']),
+                                     'applicable_data_sources': applicable_data_sources,
+                                     'applicable_dettect_data_sources': applicable_dettect_data_sources,
+                                     'available_data_sources': applicable_data_sources.intersection(available_for_system),
+                                     'available_dettect_data_sources': applicable_dettect_data_sources.intersection(available_for_system)})
+    return systems_data_sources
+
+
 def _map_and_colorize_techniques(my_ds, systems, exceptions, domain, layer_settings):
     """
     Determine the color of the technique based on how many data sources are available per technique. Also, it will
@@ -58,58 +76,46 @@ def _map_and_colorize_techniques(my_ds, systems, exceptions, domain, layer_setti
     techniques = load_attack_data(DATA_TYPE_STIX_ALL_TECH_ENTERPRISE if domain ==
                                   'enterprise-attack' else DATA_TYPE_STIX_ALL_TECH_ICS if domain == 'ics-attack' else DATA_TYPE_STIX_ALL_TECH_MOBILE)
     output_techniques = []
+    exceptions_upper = {e.upper() for e in exceptions}
+    systems_data_sources = _get_systems_data_sources(my_ds, systems, domain)
+
+    show_metadata = 'showMetadata' not in layer_settings.keys() or str(layer_settings['showMetadata']) == 'True'
 
     for t in techniques:
         tech_id = t['technique_id']
-        if tech_id not in list(map(lambda x: x.upper(), exceptions)):
-            scores_idx = 0
+        if tech_id not in exceptions_upper:
             ds_scores = []
-            system_available_data_sources = {}
+            # the systems relevant for this technique and their available data sources (in the same order as ds_scores),
+            # this is kept to populate the metadata without having to determine everything again
+            relevant_systems = []
+            tech_platforms = set(t['x_mitre_platforms'])
 
             # calculate visibility score per system
-            for system in systems:
+            for system_ds in systems_data_sources:
                 # the system is relevant for this technique due to a match in ATT&CK platform
-                if len(set(system['platform']).intersection(set(t['x_mitre_platforms']))) > 0:
-                    applicable_data_sources = get_applicable_data_sources_platform(system['platform'], domain)
-                    applicable_dettect_data_sources = get_applicable_dettect_data_sources_platform(system['platform'], domain)
-                    total_ds_count = _count_applicable_data_sources(t, applicable_data_sources, applicable_dettect_data_sources)
+                if not system_ds['platforms'].isdisjoint(tech_platforms):
+                    total_ds_count = _count_applicable_data_sources(t, system_ds['applicable_data_sources'],
+                                                                    system_ds['applicable_dettect_data_sources'])
+                    available_ds = []
 
                     if total_ds_count > 0:  # the system's platform has a data source applicable to this technique
-                        ds_count = 0
-                        for ds in t['data_components']:
-                            # the ATT&CK data source is applicable to this system and available
-                            if ds in applicable_data_sources and ds in my_ds.keys() and _system_in_data_source_details_object(my_ds[ds], system):
-                                if ds_count == 0:
-                                    system_available_data_sources[scores_idx] = [ds]
-                                else:
-                                    system_available_data_sources[scores_idx].append(ds)
-                                ds_count += 1
-
-                        for cdc in t['dettect_data_sources']:
-                            if cdc in applicable_dettect_data_sources and cdc in my_ds.keys() and _system_in_data_source_details_object(my_ds[cdc], system):
-                                if ds_count == 0:
-                                    system_available_data_sources[scores_idx] = [cdc]
-                                else:
-                                    system_available_data_sources[scores_idx].append(cdc)
-                                ds_count += 1
-
-                        if ds_count > 0:
-                            ds_scores.append((float(ds_count) / float(total_ds_count)) * 100)
-                        else:
-                            ds_scores.append(0)  # none of the applicable data sources are available for this system
+                        # the (DeTT&CT) data sources that are applicable to this system and available
+                        available_ds = [ds for ds in t['data_components'] if ds in system_ds['available_data_sources']] + \
+                                       [cdc for cdc in t['dettect_data_sources'] if cdc in system_ds['available_dettect_data_sources']]
+                        # when none of the applicable data sources are available for this system, the score is 0
+                        ds_scores.append((float(len(available_ds)) / float(total_ds_count)) * 100)
                     else:
                         # the technique is applicable to this system (and thus its platform(s)),
                         # but none of the technique's listed data source are applicable for its platform(s)
                         ds_scores.append(0)
-                    scores_idx += 1
+                    relevant_systems.append((system_ds, available_ds))
 
             # Populate the metadata.
             avg_ds_score = 0
             if not all(s == 0 for s in ds_scores):
                 avg_ds_score = float(sum(ds_scores)) / float(len(ds_scores))
 
-            color = COLOR_DS_25p if avg_ds_score <= 25 else COLOR_DS_50p if avg_ds_score <= 50 else COLOR_DS_75p \
-                if avg_ds_score <= 75 else COLOR_DS_99p if avg_ds_score <= 99 else COLOR_DS_100p
+            color = DS_COVERAGE_COLORS[bisect_left(DS_COVERAGE_COLOR_THRESHOLDS, avg_ds_score)]
 
             d = dict()
             d['techniqueID'] = tech_id
@@ -119,35 +125,21 @@ def _map_and_colorize_techniques(my_ds, systems, exceptions, domain, layer_setti
             d['enabled'] = True
             d['metadata'] = []
 
-            if 'showMetadata' not in layer_settings.keys() or ('showMetadata' in layer_settings.keys() and str(layer_settings['showMetadata']) == 'True'):
-                scores_idx = 0
-                divider = 0
-                for system in systems:
-                    # the system is relevant for this technique due to a match in ATT&CK platform
-                    if len(set(system['platform']).intersection(set(t['x_mitre_platforms']))) > 0:
-                        score = ds_scores[scores_idx]
+            if show_metadata:
+                for idx, ((system_ds, available_ds), score) in enumerate(zip(relevant_systems, ds_scores)):
+                    if idx != 0:
+                        d['metadata'].append({'divider': True})
 
-                        if divider != 0:
-                            d['metadata'].append({'divider': True})
-                        divider += 1
+                    d['metadata'].append({'name': 'Applicable to', 'value': system_ds['system']['applicable_to']})
 
-                        d['metadata'].append({'name': 'Applicable to', 'value': system['applicable_to']})
+                    app_data_sources = get_applicable_data_sources_technique(t['data_components'], system_ds['applicable_data_sources'])
+                    app_dettect_data_sources = get_applicable_dettect_data_sources_technique(
+                        t['dettect_data_sources'], system_ds['applicable_dettect_data_sources'])
 
-                        app_data_sources = get_applicable_data_sources_technique(
-                            t['data_components'], get_applicable_data_sources_platform(system['platform'], domain))
-                        app_dettect_data_sources = get_applicable_dettect_data_sources_technique(
-                            t['dettect_data_sources'], get_applicable_dettect_data_sources_platform(system['platform'], domain))
-
-                        if score > 0:
-                            d['metadata'].append({'name': 'Available data sources', 'value': ', '.join(
-                                system_available_data_sources[scores_idx])})
-                        else:
-                            d['metadata'].append({'name': 'Available data sources', 'value': ''})
-
-                        d['metadata'].append({'name': 'ATT&CK data sources', 'value': ', '.join(app_data_sources)})
-                        d['metadata'].append({'name': 'DeTT&CT data sources', 'value': ', '.join(app_dettect_data_sources)})
-                        d['metadata'].append({'name': 'Score', 'value': str(int(score)) + '%'})
-                        scores_idx += 1
+                    d['metadata'].append({'name': 'Available data sources', 'value': ', '.join(available_ds)})
+                    d['metadata'].append({'name': 'ATT&CK data sources', 'value': ', '.join(app_data_sources)})
+                    d['metadata'].append({'name': 'DeTT&CT data sources', 'value': ', '.join(app_dettect_data_sources)})
+                    d['metadata'].append({'name': 'Score', 'value': str(int(score)) + '%'})
 
                 d['metadata'] = make_layer_metadata_compliant(d['metadata'])
 
@@ -158,6 +150,20 @@ def _map_and_colorize_techniques(my_ds, systems, exceptions, domain, layer_setti
     return output_techniques
 
 
+def _format_date(value):
+    """
+    Format a date value from the YAML administration file as a string
+    :param value: a date/datetime object, a string or None
+    :return: the date as 'YYYY-MM-DD', or an empty string when there is no date
+    """
+    if value is None:
+        return ''
+    elif isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    else:
+        return str(value)
+
+
 def _indent_comment(comment, indent):
     """
     Indent a multiline general, visibility, detection comment by x spaces
@@ -172,18 +178,6 @@ def _indent_comment(comment, indent):
         return comment
 
 
-def _get_technique_yaml_obj(techniques, tech_id):
-    """
-    Get at technique YAML obj from the provided list of techniques YAML objects which as the provided technique ID
-    :param techniques: list of technique YAML objects
-    :param tech_id: ATT&CK ID
-    :return: technique YAML obj
-    """
-    for tech in techniques:
-        if tech['technique_id'] == tech_id:
-            return tech
-
-
 def generate_data_sources_layer(filename, output_filename, layer_name, layer_settings):
     """
     Generates a generic layer for data sources.
@@ -205,10 +199,9 @@ def generate_data_sources_layer(filename, output_filename, layer_name, layer_set
     layer = get_layer_template_data_sources(layer_name, 'description', platforms, domain, layer_settings)
     layer['techniques'] = my_techniques
 
-    json_string = simplejson.dumps(layer).replace('}, ', '},\n')
     if not output_filename:
         output_filename = create_output_filename('data_sources', name)
-    write_file(output_filename, json_string)
+    write_json_file(output_filename, layer)
 
 
 def plot_data_sources_graph(filename, output_filename):
@@ -220,16 +213,12 @@ def plot_data_sources_graph(filename, output_filename):
     """
     my_data_sources, name, _, _, _ = load_data_sources(filename)
 
-    graph_values = []
-    for ds_global, ds_detail in my_data_sources.items():
-        for ds in ds_detail['data_source']:
-            if ds['date_connected']:
-                yyyymmdd = ds['date_connected'].strftime('%Y-%m-%d')
-                graph_values.append({'date': yyyymmdd, 'count': 1})
-
-    import pandas as pd
-    df = pd.DataFrame(graph_values).groupby('date', as_index=False)[['count']].sum()
-    df['cumcount'] = df['count'].cumsum()
+    # count the number of connected data sources per date, and make this cumulative through time
+    count_per_date = Counter(ds['date_connected'].strftime('%Y-%m-%d')
+                             for ds_detail in my_data_sources.values()
+                             for ds in ds_detail['data_source'] if ds['date_connected'])
+    dates = sorted(count_per_date)
+    cumulative_count = list(accumulate(count_per_date[d] for d in dates))
 
     if not output_filename:
         output_filename = 'graph_data_sources'
@@ -240,7 +229,7 @@ def plot_data_sources_graph(filename, output_filename):
     import plotly.graph_objs as go
     import plotly.offline as offline
     offline.plot(
-        {'data': [go.Scatter(x=df['date'], y=df['cumcount'])],
+        {'data': [go.Scatter(x=dates, y=cumulative_count)],
          'layout': go.Layout(title="# of data sources for " + name)},
         filename=output_filename, auto_open=False
     )
@@ -264,7 +253,9 @@ def export_data_source_list_to_excel(filename, output_filename, eql_search=False
     elif output_filename.endswith('.xlsx'):
         output_filename = output_filename.replace('.xlsx', '')
     excel_filename = get_non_existing_filename('output/' + output_filename, 'xlsx')
-    workbook = xlsxwriter.Workbook(excel_filename)
+    # constant_memory: every row is flushed to disk once the next row is started. This requires writing the cells
+    # strictly row by row, which is what we do below.
+    workbook = xlsxwriter.Workbook(excel_filename, {'constant_memory': True})
     worksheet = workbook.add_worksheet('Data sources')
 
     # Formatting:
@@ -280,6 +271,8 @@ def export_data_source_list_to_excel(filename, output_filename, eql_search=False
     dq_score_3 = workbook.add_format({'valign': 'top', 'align': 'center', 'bg_color': COLOR_DS_75p, 'font_color': '#ffffff'})
     dq_score_4 = workbook.add_format({'valign': 'top', 'align': 'center', 'bg_color': COLOR_DS_99p, 'font_color': '#ffffff'})
     dq_score_5 = workbook.add_format({'valign': 'top', 'align': 'center', 'bg_color': COLOR_DS_100p, 'font_color': '#ffffff'})
+    # DQ score format indexed by the integer part of the score (a score of 0 is handled separately)
+    dq_score_formats = [dq_score_1, dq_score_1, dq_score_2, dq_score_3, dq_score_4, dq_score_5, no_score]
 
     # Title
     worksheet.write(0, 0, 'Data sources for: ' + name, format_title)
@@ -325,37 +318,28 @@ def export_data_source_list_to_excel(filename, output_filename, eql_search=False
     for ds_global, ds_detail in my_data_sources.items():
 
         for ds in ds_detail['data_source']:
-            worksheet.write(y, 0, ds_global, valign_top)
-
-            date_registered = ds['date_registered'].strftime('%Y-%m-%d') if isinstance(ds['date_registered'], datetime) else ds['date_registered']
-            date_connected = ds['date_connected'].strftime('%Y-%m-%d') if isinstance(ds['date_connected'], datetime) else ds['date_connected']
+            data_quality = ds['data_quality']
 
+            # adjacent cells sharing the same format are written with a single write_row call
+            worksheet.write(y, 0, ds_global, valign_top)
             worksheet.write(y, 1, ', '.join(ds['applicable_to']), wrap_text)
-            worksheet.write(y, 2, str(date_registered).replace('None', ''), valign_top)
-            worksheet.write(y, 3, str(date_connected).replace('None', ''), valign_top)
-            worksheet.write(y, 4, ', '.join(ds['products']).replace('None', ''), valign_top)
+            worksheet.write_row(y, 2, [_format_date(ds['date_registered']),
+                                       _format_date(ds['date_connected']),
+                                       ', '.join(p for p in ds['products'] if p not in (None, 'None'))], valign_top)
             worksheet.write(y, 5, ds['comment'][:-1] if ds['comment'].endswith('\n') else ds['comment'], wrap_text)
             worksheet.write(y, 6, str(ds['available_for_data_analytics']), valign_top)
-            worksheet.write(y, 7, ds['data_quality']['device_completeness'], format_center_valign_top)
-            worksheet.write(y, 8, ds['data_quality']['data_field_completeness'], format_center_valign_top)
-            worksheet.write(y, 9, ds['data_quality']['timeliness'], format_center_valign_top)
-            worksheet.write(y, 10, ds['data_quality']['consistency'], format_center_valign_top)
-            worksheet.write(y, 11, ds['data_quality']['retention'], format_center_valign_top)
-
-            score = 0
-            score_count = 0
-            for k, v in ds['data_quality'].items():
-                # the below DQ dimensions are given more weight in the calculation of the DQ score.
-                if k in ['device_completeness', 'data_field_completeness', 'retention']:
-                    score += (v * 2)
-                    score_count += 2
-                else:
-                    score += v
-                    score_count += 1
+            worksheet.write_row(y, 7, [data_quality['device_completeness'],
+                                       data_quality['data_field_completeness'],
+                                       data_quality['timeliness'],
+                                       data_quality['consistency'],
+                                       data_quality['retention']], format_center_valign_top)
+
+            # some DQ dimensions are given more weight in the calculation of the DQ score (see DATA_QUALITY_WEIGHTS).
+            score = sum(v * DATA_QUALITY_WEIGHTS.get(k, 1) for k, v in data_quality.items())
             if score > 0:
-                score = score / score_count
+                score = score / sum(DATA_QUALITY_WEIGHTS.get(k, 1) for k in data_quality)
 
-            worksheet.write(y, 12, score, dq_score_0 if score == 0 else dq_score_1 if score < 2 else dq_score_2 if score < 3 else dq_score_3 if score < 4 else dq_score_4 if score < 5 else dq_score_5 if score < 6 else no_score)  # noqa
+            worksheet.write(y, 12, score, dq_score_0 if score == 0 else dq_score_formats[max(0, min(int(score), 6))])
             y += 1
 
     try:
@@ -392,13 +376,13 @@ def _print_tech_visibility_object_diff(old_tech, new_tech, tech_id, tech_name):
     print('')
     print('OLD visibility object(s):')
     for old_vis_obj in old_tech['visibility']:
-        old_score_date = get_latest_date(old_vis_obj)
+        old_score, old_score_date, old_score_comment, old_score_auto_generated = get_latest_score_values(old_vis_obj)
         old_score_date = old_score_date.strftime('%Y-%m-%d') if old_score_date is not None else ''
         print(' - Applicable to: ' + ', '.join(old_vis_obj['applicable_to']))
         print('   * Date:                     ' + old_score_date)
-        print('   * Score:                    ' + str(get_latest_score(old_vis_obj)))
-        print('   * Visibility score comment: ' + _indent_comment(get_latest_comment(old_vis_obj), 31))
-        print('   * Auto generated:           ' + str(get_latest_score_obj(old_vis_obj).get('auto_generated', 'False')))
+        print('   * Score:                    ' + str(old_score))
+        print('   * Visibility score comment: ' + _indent_comment(old_score_comment, 31))
+        print('   * Auto generated:           ' + str(old_score_auto_generated))
     print('NEW visibility object(s):')
     for new_vis_obj in new_tech['visibility']:
         new_score_date = new_vis_obj['score_logbook'][0]['date'].strftime('%Y-%m-%d')
@@ -426,13 +410,13 @@ def _print_visibility_object_diff(old_vis_obj, new_vis_obj, tech_id, tech_name):
     print(' - Visibility comment:       ' + _indent_comment(old_vis_obj['comment'], 29))
     print('')
     print('OLD score object:')
-    old_score_date = get_latest_date(old_vis_obj)
+    old_score, old_score_date, old_score_comment, old_score_auto_generated = get_latest_score_values(old_vis_obj)
     old_score_date = old_score_date.strftime('%Y-%m-%d') if old_score_date is not None else ''
     new_score_date = new_vis_obj['score_logbook'][0]['date'].strftime('%Y-%m-%d')
     print(' - Date:                     ' + old_score_date)
-    print(' - Score:                    ' + str(get_latest_score(old_vis_obj)))
-    print(' - Visibility score comment: ' + _indent_comment(get_latest_comment(old_vis_obj), 29))
-    print(' - Auto generated:           ' + str(get_latest_score_obj(old_vis_obj).get('auto_generated', 'False')))
+    print(' - Score:                    ' + str(old_score))
+    print(' - Visibility score comment: ' + _indent_comment(old_score_comment, 29))
+    print(' - Auto generated:           ' + str(old_score_auto_generated))
     print('NEW score object:')
     print(' - Date:                     ' + new_score_date)
     print(' - Score:                    ' + str(new_vis_obj['score_logbook'][0]['score']))
@@ -458,14 +442,11 @@ def _print_progress_visibility_update(count, total):
 def _add_visibility_object_to_dict(dict_vis_objects, tech_id, vis_obj):
     """
     Add visibility object(s) to a dict with the structure {tech_id: [visibility_obj]}
-    :param dict_vis_objects: the dictionary to add the visibility object(s) to
+    :param dict_vis_objects: the dictionary (a defaultdict(list)) to add the visibility object(s) to
     :param tech_id: the technique ID to which the visibility object(s) needs to be added
     :param vis_obj: the visibility object(s) to add to the dictionary
     return: updated dict_vis_objects
     """
-    if tech_id not in dict_vis_objects:
-        dict_vis_objects[tech_id] = []
-
     if isinstance(vis_obj, list):
         dict_vis_objects[tech_id].extend(deepcopy(vis_obj))
     else:
@@ -474,6 +455,45 @@ def _add_visibility_object_to_dict(dict_vis_objects, tech_id, vis_obj):
     return dict_vis_objects
 
 
+def _copy_yaml_obj_detection(detection):
+    """
+    Copy a detection object, including its lists. This is much faster than a deepcopy.
+    :param detection: detection object (e.g. YAML_OBJ_DETECTION)
+    :return: copy of the detection object
+    """
+    return dict(detection,
+                applicable_to=list(detection['applicable_to']),
+                location=list(detection['location']),
+                score_logbook=[dict(score_obj) for score_obj in detection['score_logbook']])
+
+
+def _new_technique_yaml_obj(tech_id, tech_name):
+    """
+    Create a new technique object for the technique administration file based on YAML_OBJ_TECHNIQUE
+    :param tech_id: ATT&CK technique ID
+    :param tech_name: ATT&CK technique name
+    :return: technique object
+    """
+    return dict(YAML_OBJ_TECHNIQUE,
+                technique_id=tech_id,
+                technique_name=tech_name,
+                detection=[_copy_yaml_obj_detection(d) for d in YAML_OBJ_TECHNIQUE['detection']],
+                visibility=list(YAML_OBJ_TECHNIQUE['visibility']))
+
+
+def _new_visibility_yaml_obj(applicable_to, score, score_date):
+    """
+    Create a new auto generated visibility object based on YAML_OBJ_VISIBILITY
+    :param applicable_to: list with applicable to values
+    :param score: visibility score
+    :param score_date: date of the score
+    :return: visibility object
+    """
+    return dict(YAML_OBJ_VISIBILITY,
+                applicable_to=applicable_to,
+                score_logbook=[dict(score_obj, score=score, date=score_date) for score_obj in YAML_OBJ_VISIBILITY['score_logbook']])
+
+
 def update_technique_administration_file(file_data_sources, file_tech_admin):
     """
     Update the visibility scores in the provided technique administration file
@@ -581,13 +601,12 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
         print('\n')
 
     # check if we have tech IDs for which we now have visibility, but which were not yet part of the tech. admin file
-    cur_tech_ids = set(cur_visibility_scores.keys())
+    cur_tech_ids = set(cur_visibility_scores)
     new_tech_ids = set()
 
     del_unnecesary_all_tech_ids = set()  # resulted from 'all_techniques=True)', which we do need to call in this way
     # because we also want to update visibilty scores for which the score has become 0 (e.g. due to a removal of a data source)
-    tech_idx = 0
-    for tech in new_visibility_scores['techniques']:
+    for tech_idx, tech in enumerate(new_visibility_scores['techniques']):
         tech_id = tech['technique_id']
         score = False
 
@@ -600,12 +619,12 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
         if score:
             new_tech_ids.add(tech_id)
 
-        tech_idx += 1
     tech_ids_new = new_tech_ids.difference(cur_tech_ids)
 
     # remove techniques which came from 'all_techniques=True)', but that are not present as a technqiue in the current/outdated tech file
-    for idx in sorted(del_unnecesary_all_tech_ids, reverse=True):
-        del new_visibility_scores['techniques'][idx]
+    # (rebuilding the list is O(n), while deleting the items one by one is O(n^2))
+    new_visibility_scores['techniques'] = [tech for idx, tech in enumerate(new_visibility_scores['techniques'])
+                                           if idx not in del_unnecesary_all_tech_ids]
 
     # Add the new tech. to the ruamel instance: 'yaml_file_tech_admin'
     if len(tech_ids_new) > 0:
@@ -643,7 +662,7 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
     input('\n' + TXT_ANY_KEY_TO_CONTINUE)
     print('\n')
 
-    new_vis_objects = {}  # {tech_id: [visibility_obj]}
+    new_vis_objects = defaultdict(list)  # {tech_id: [visibility_obj]}
 
     new_visibility_scores_updated = deepcopy(new_visibility_scores)
     cur_visibility_scores_updated = deepcopy(cur_visibility_scores)
@@ -657,20 +676,16 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
     total_tech_ids = len(new_visibility_scores['techniques'])
     tech_ids_to_delete = set()
     tech_idxs_to_delete = set()
-    idx_tech_id = 0
-    for new_tech in new_visibility_scores['techniques']:
+    for idx_tech_id, new_tech in enumerate(new_visibility_scores['techniques']):
         tech_id = new_tech['technique_id']
         tech_name = new_tech['technique_name']
 
         if tech_id in cur_visibility_scores:
-            idx_new_vis_obj = 0
             set_new_vis_obj_del = set()
             set_old_vis_obj_del = set()
 
-            for new_vis_obj in new_tech['visibility']:
-                idx_old_vis_obj = 0
-
-                for old_vis_obj in cur_visibility_scores[tech_id]['visibility']:
+            for idx_new_vis_obj, new_vis_obj in enumerate(new_tech['visibility']):
+                for idx_old_vis_obj, old_vis_obj in enumerate(cur_visibility_scores[tech_id]['visibility']):
                     # we have a MATCH on the applicable_to value between the old and new visibility object
                     if set(new_vis_obj['applicable_to']) == set(old_vis_obj['applicable_to']):
 
@@ -722,27 +737,24 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
                         set_new_vis_obj_del.add(idx_new_vis_obj)
                         set_old_vis_obj_del.add(idx_old_vis_obj)
 
-                    idx_old_vis_obj += 1
-                idx_new_vis_obj += 1
-
             # delete visibility objects (old and new) which we processed (possibly including the technique itself)
-            for idx in sorted(set_new_vis_obj_del, reverse=True):
-                del new_visibility_scores_updated['techniques'][idx_tech_id]['visibility'][idx]
+            new_tech_updated = new_visibility_scores_updated['techniques'][idx_tech_id]
+            new_tech_updated['visibility'] = [vis_obj for idx, vis_obj in enumerate(new_tech_updated['visibility'])
+                                              if idx not in set_new_vis_obj_del]
 
-            if len(new_visibility_scores_updated['techniques'][idx_tech_id]['visibility']) == 0:
+            if len(new_tech_updated['visibility']) == 0:
                 tech_idxs_to_delete.add(idx_tech_id)
 
-            for idx in sorted(set_old_vis_obj_del, reverse=True):
-                del cur_visibility_scores_updated[tech_id]['visibility'][idx]
+            cur_tech_updated = cur_visibility_scores_updated[tech_id]
+            cur_tech_updated['visibility'] = [vis_obj for idx, vis_obj in enumerate(cur_tech_updated['visibility'])
+                                              if idx not in set_old_vis_obj_del]
 
-            if len(cur_visibility_scores_updated[tech_id]['visibility']) == 0:
+            if len(cur_tech_updated['visibility']) == 0:
                 tech_ids_to_delete.add(tech_id)
 
-        idx_tech_id += 1
-
     # delete techniques which no longer have any visibility objects
-    for idx in sorted(tech_idxs_to_delete, reverse=True):
-        del new_visibility_scores_updated['techniques'][idx]
+    new_visibility_scores_updated['techniques'] = [tech for idx, tech in enumerate(new_visibility_scores_updated['techniques'])
+                                                   if idx not in tech_idxs_to_delete]
     for tech_id in tech_ids_to_delete:
         del cur_visibility_scores_updated[tech_id]
 
@@ -763,9 +775,7 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
     we_have_updated_scores = False
 
     total_tech_ids = len(new_visibility_scores_updated['techniques'])
-    idx_tech_id = 0
-
-    for new_tech in new_visibility_scores_updated['techniques']:
+    for idx_tech_id, new_tech in enumerate(new_visibility_scores_updated['techniques']):
         tech_id = new_tech['technique_id']
         tech_name = new_tech['technique_name']
 
@@ -830,21 +840,18 @@ def update_technique_administration_file(file_data_sources, file_tech_admin):
                 not_upd_str = ' - A visibility score in this technique was NOT updated: {0:<10} (applicable to: {1})'
                 print(not_upd_str.format(tech_id, ', '.join(applicable_to)))
 
-        idx_tech_id += 1
-
     # Update visibility objects in the technique administration file that will be written to disk
-    idx_tech = 0
     for tech in yaml_file_tech_admin_updated['techniques']:
         tech_id = tech['technique_id']
         if tech_id not in tech_ids_new and tech_id in new_vis_objects:
-            yaml_file_tech_admin_updated['techniques'][idx_tech]['visibility'] = new_vis_objects[tech_id]
-        idx_tech += 1
+            tech['visibility'] = new_vis_objects[tech_id]
 
     # create backup of the current tech. admin YAML file
     if file_updated:
         print('')
         backup_file(file_tech_admin)
 
+        # the fixed lines are created before opening the file, so it is not truncated when dumping the YAML fails
         yaml_file_tech_admin_updated = fix_date_and_remove_null(yaml_file_tech_admin_updated, today, input_type='ruamel')
 
         with open(file_tech_admin, 'w') as fd:
@@ -881,40 +888,41 @@ def generate_technique_administration_file(filename, output_filename, write_file
     yaml_file['platform'] = yaml_platform
     yaml_file['techniques'] = []
     today = dt.now()
+    exceptions_upper = {e.upper() for e in exceptions}
+    systems_data_sources = _get_systems_data_sources(my_ds, systems, domain)
+    systems_platforms = set(chain.from_iterable(s['platforms'] for s in systems_data_sources))
 
     # Score visibility based on the number of available data sources and the exceptions
     for t in techniques:
-        mitre_platforms = t.get('x_mitre_platforms', [])
+        mitre_platforms = set(t.get('x_mitre_platforms', []))
+        # skip techniques that are not applicable to any of the systems' platforms
+        if mitre_platforms.isdisjoint(systems_platforms):
+            continue
+
         tech_id = t['technique_id']
         tech = None
         visibility_obj_count = 0
 
-        if tech_id not in list(map(lambda x: x.upper(), exceptions)):
+        if tech_id not in exceptions_upper:
             # calculate visibility score per system
-            for system in systems:
+            for system_ds in systems_data_sources:
+                system = system_ds['system']
                 ds_score = -1
                 platform_match = False
                 # the system is relevant for this technique due to a match in ATT&CK platform
-                if len(set(system['platform']).intersection(set(mitre_platforms))) > 0:
+                if not system_ds['platforms'].isdisjoint(mitre_platforms):
                     platform_match = True
-                    applicable_data_sources = get_applicable_data_sources_platform(system['platform'], domain)
-                    applicable_dettect_data_sources = get_applicable_dettect_data_sources_platform(system['platform'], domain)
-                    total_ds_count = _count_applicable_data_sources(t, applicable_data_sources, applicable_dettect_data_sources)
+                    total_ds_count = _count_applicable_data_sources(t, system_ds['applicable_data_sources'],
+                                                                    system_ds['applicable_dettect_data_sources'])
 
                     if total_ds_count > 0:  # the system's platform has data source applicable to this technique
-                        ds_count = 0
-                        for ds in t['data_components']:
-                            # the ATT&CK data source is applicable to this system and available
-                            if ds in applicable_data_sources and ds in my_ds.keys() and _system_in_data_source_details_object(my_ds[ds], system):
-                                ds_count += 1
-
-                        for cdc in t['dettect_data_sources']:
-                            if cdc in applicable_dettect_data_sources and cdc in my_ds.keys() and _system_in_data_source_details_object(my_ds[cdc], system):
-                                ds_count += 1
+                        # the (DeTT&CT) data sources that are applicable to this system and available
+                        ds_count = _count_applicable_data_sources(t, system_ds['available_data_sources'],
+                                                                  system_ds['available_dettect_data_sources'])
 
                         if ds_count > 0:
                             result = (float(ds_count) / float(total_ds_count)) * 100
-                            ds_score = 1 if result <= 49 else 2 if result <= 74 else 3 if result <= 99 else 4
+                            ds_score = DS_COVERAGE_VISIBILITY_SCORES[bisect_left(DS_COVERAGE_VISIBILITY_THRESHOLDS, result)]
                         else:
                             ds_score = 0  # none of the applicable data sources are available for this system
                     else:
@@ -926,9 +934,7 @@ def generate_technique_administration_file(filename, output_filename, write_file
                 if ds_score > 0 or (all_techniques and platform_match):
                     # the ATT&CK technique is not yet part of the YAML file
                     if visibility_obj_count == 0:
-                        tech = deepcopy(YAML_OBJ_TECHNIQUE)
-                        tech['technique_id'] = tech_id
-                        tech['technique_name'] = t['name']
+                        tech = _new_technique_yaml_obj(tech_id, t['name'])
 
                     # score can be -1 due to all_techniques
                     ds_score = 0 if ds_score == -1 else ds_score
@@ -942,10 +948,7 @@ def generate_technique_administration_file(filename, output_filename, write_file
                                 same_score = True
                                 break
                     if not same_score:
-                        tech['visibility'].append(deepcopy(YAML_OBJ_VISIBILITY))
-                        tech['visibility'][visibility_obj_count]['score_logbook'][0]['score'] = ds_score
-                        tech['visibility'][visibility_obj_count]['score_logbook'][0]['date'] = today
-                        tech['visibility'][visibility_obj_count]['applicable_to'] = [system['applicable_to']]
+                        tech['visibility'].append(_new_visibility_yaml_obj([system['applicable_to']], ds_score, today))
                         visibility_obj_count += 1
             if tech:
                 # check if we have an applicable to value that can be replaced by the value 'all'
@@ -964,10 +967,6 @@ def generate_technique_administration_file(filename, output_filename, write_file
         # create the file lines by writing it to memory
         _yaml.dump(yaml_file, file)
         file.seek(0)
-        file_lines = file.readlines()
-
-        # remove the single quotes from the date
-        yaml_file_lines = fix_date_and_remove_null(file_lines, today, input_type='list')
 
         if not output_filename:
             output_filename = 'techniques-administration-' + normalize_name_to_filename(name)
@@ -975,7 +974,8 @@ def generate_technique_administration_file(filename, output_filename, write_file
             output_filename = output_filename.replace('.yaml', '')
         output_filename = get_non_existing_filename('output/' + output_filename, 'yaml')
         with open(output_filename, 'w') as f:
-            f.writelines(yaml_file_lines)
+            # remove the single quotes from the date
+            fix_date_and_remove_null(file, today, input_type='file', output=f)
         print("File written:   " + output_filename)
     else:
         return yaml_file
@@ -1,5 +1,11 @@
 import os
+import re
 import shutil
+import simplejson
+
+# translation tables are built once, instead of chaining str.replace calls on every filename
+_CLEAN_FILENAME_TABLE = str.maketrans('', '', '/\\:')
+_NORMALIZE_FILENAME_TABLE = str.maketrans({' ': '-', '/': '-'})
 
 
 def _clean_filename(filename):
@@ -8,7 +14,7 @@ def _clean_filename(filename):
     :param filename: Input filename
     :return: sanitized filename
     """
-    return filename.replace('/', '').replace('\\', '').replace(':', '')[:200]
+    return filename.translate(_CLEAN_FILENAME_TABLE)[:200]
 
 
 def write_file(filename, content):
@@ -28,17 +34,49 @@ def write_file(filename, content):
     print('File written:   ' + output_filename)
 
 
+def write_json_file(filename, data):
+    """
+    Serializes data to JSON and streams it directly into a file, without building the complete JSON string in memory
+    first. Ensures if the file already exists it won't be overwritten by appending a number as suffix.
+    :param filename: filename
+    :param data: the data (e.g. a Navigator layer dict) that needs to be written to the file
+    :return:
+    """
+    output_filename = 'output/%s' % _clean_filename(filename)
+    output_filename = get_non_existing_filename(output_filename, 'json')
+
+    with open(output_filename, 'w') as f:
+        simplejson.dump(data, f, indent=1)
+
+    print('File written:   ' + output_filename)
+
+
+def _get_next_suffix(path_prefix, extension):
+    """
+    Determine the number to use as suffix for a file named <path_prefix><number>.<extension>, based on a single listing
+    of the directory instead of checking the existence of every possible filename on disk.
+    :param path_prefix: the path and filename up to the number
+    :param extension: file extension
+    :return: the highest number already in use plus one, or 1 when there is no such file yet
+    """
+    directory, name_prefix = os.path.split(path_prefix)
+    regex_suffix = re.compile(re.escape(name_prefix) + r'(\d+)\.' + re.escape(extension) + '$')
+    try:
+        with os.scandir(directory or '.') as entries:
+            suffixes = [int(m.group(1)) for m in (regex_suffix.match(e.name) for e in entries) if m]
+    except FileNotFoundError:
+        suffixes = []
+    return max(suffixes, default=0) + 1
+
+
 def backup_file(filename):
     """
     Create a backup of the provided file
     :param filename: existing YAML filename
     :return:
     """
-    suffix = 1
+    suffix = _get_next_suffix(filename.replace('.yaml', '_backup_'), 'yaml')
     backup_filename = filename.replace('.yaml', '_backup_' + str(suffix) + '.yaml')
-    while os.path.exists(backup_filename):
-        backup_filename = backup_filename.replace('_backup_' + str(suffix) + '.yaml', '_backup_' + str(suffix + 1) + '.yaml')
-        suffix += 1
 
     shutil.copy2(filename, backup_filename)
     print('Written backup file:   ' + backup_filename + '\n')
@@ -63,10 +101,9 @@ def get_non_existing_filename(filename, extension):
     """
     if filename.endswith('.' + extension):
         filename = filename.replace('.' + extension, '')
+
     if os.path.exists('%s.%s' % (filename, extension)):
-        suffix = 1
-        while os.path.exists('%s_%s.%s' % (filename, suffix, extension)):
-            suffix += 1
+        suffix = _get_next_suffix(filename + '_', extension)
         output_filename = '%s_%s.%s' % (filename, suffix, extension)
     else:
         output_filename = '%s.%s' % (filename, extension)
@@ -79,4 +116,4 @@ def normalize_name_to_filename(name):
     :param name: input filename
     :return: normalized filename
     """
-    return name.lower().replace(' ', '-').replace('/', '-')
+    return name.lower().translate(_NORMALIZE_FILENAME_TABLE)
@@ -1,7 +1,11 @@
 import os
 import pickle
+import time
+from collections import defaultdict
+from copy import deepcopy
 from datetime import datetime as dt
 from io import StringIO
+from itertools import chain
 from ruamel.yaml import YAML
 from ruamel.yaml.timestamp import TimeStamp as ruamelTimeStamp
 from requests import exceptions
@@ -16,6 +20,25 @@ import dateutil.parser
 
 local_stix_path = None
 
+# in-process cache of the loaded ATT&CK data: {data_type: data}
+_attack_data_memory_cache = {}
+
+# ATT&CK IDs that have already been looked up in the external references: {stix_id: attack_id}
+_attack_id_cache = {}
+
+# the attack_client instance is reused for all ATT&CK data types that are not cached yet
+_attack_client_instance = None
+
+# the 'uses' relationships partitioned on target type and indexed on source_ref, see _get_uses_relationships()
+_uses_relationships = None
+
+# the ruamel.yaml instances are created once and reused for all YAML (de)serialization, see init_yaml()
+_yaml_instance = None
+_yaml_safe_instance = None
+
+# parsed YAML files: {filename: ((mtime, size), yaml_content)}, see load_yaml_file()
+_yaml_file_cache = {}
+
 
 def _save_attack_data(data, path):
     """
@@ -27,8 +50,10 @@ def _save_attack_data(data, path):
 
     if not os.path.exists('cache/'):
         os.mkdir('cache/')
+    # the data is serialized in memory and written with a single write, instead of many small writes by the pickler
+    data_bytes = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
     with open(path, 'wb') as f:
-        pickle.dump([data, dt.now()], f)
+        f.write(data_bytes)
 
 
 def _date_hook(json_dict):
@@ -60,9 +85,13 @@ def _convert_stix_techniques_to_dict(mitre, stix_attack_data):
     relationships = mitre.get_relationships(relationship_type='detects')
     tech_dc_lookup = {}
     for rl in relationships:
-        if rl['target_ref'] not in tech_dc_lookup.keys():
-            tech_dc_lookup[rl['target_ref']] = []
-        tech_dc_lookup[rl['target_ref']].append(dc_lookup[rl['source_ref']]['name'])
+        tech_dc_lookup.setdefault(rl['target_ref'], []).append(dc_lookup[rl['source_ref']]['name'])
+
+    # Index the DeTT&CT data sources on technique ID, instead of scanning the whole list for every technique
+    dds_key = 'dettect_data_sources'
+    dds_lookup = {}
+    for dds in DETTECT_DATA_SOURCES:
+        dds_lookup.setdefault(dds['technique_id'], dds)
     
     attack_data = []
     for stix_tech in stix_attack_data:
@@ -72,29 +101,25 @@ def _convert_stix_techniques_to_dict(mitre, stix_attack_data):
         tech['technique_id'] = get_attack_id(stix_tech)
         
         # Add data components to the technique:
-        tech['data_components'] = []
-        if tech['id'] in tech_dc_lookup.keys():
-            tech['data_components'] = tech_dc_lookup[tech['id']]
+        tech['data_components'] = tech_dc_lookup.get(tech['id'], [])
 
-        dds_key = 'dettect_data_sources'
         tech[dds_key] = []
-        for dds in DETTECT_DATA_SOURCES:
-            if tech['technique_id'] == dds['technique_id']:
-                # When a technique has just 1 DeTT&CT data source which is 'Network Traffic Content' then ignore this one. This means that we
-                # evaluated if that technique needs a DeTT&CT data source but it has not.
-                if not (len(dds[dds_key]) == 1 and dds[dds_key][0] == 'Network Traffic Content'):
-                    tech[dds_key] = dds[dds_key]
-
-                    # Remove 'Network Traffic Content' from the data components list when it's not listed as DeTT&CT data source. In this situation
-                    # we are intentionally replacing the 'Network Traffic Content' with our DeTT&CT data sources.
-                    if 'Network Traffic Content' not in dds[dds_key] and 'Network Traffic Content' in tech['data_components']:
-                        tech['data_components'].remove('Network Traffic Content')
-
-                    # Remove 'Network Traffic Content' from the DeTT&CT data sources list when having both DeTT&CT data sources ánd 'Network Traffic Content'.
-                    # That's the case where we keep 'Network Traffic Content' in the data components list.
-                    if 'Network Traffic Content' in dds[dds_key]:
-                        tech[dds_key].remove('Network Traffic Content')
-                break
+        dds = dds_lookup.get(tech['technique_id'])
+        if dds:
+            # When a technique has just 1 DeTT&CT data source which is 'Network Traffic Content' then ignore this one. This means that we
+            # evaluated if that technique needs a DeTT&CT data source but it has not.
+            if not (len(dds[dds_key]) == 1 and dds[dds_key][0] == 'Network Traffic Content'):
+                tech[dds_key] = dds[dds_key]
+
+                # Remove 'Network Traffic Content' from the data components list when it's not listed as DeTT&CT data source. In this situation
+                # we are intentionally replacing the 'Network Traffic Content' with our DeTT&CT data sources.
+                if 'Network Traffic Content' not in dds[dds_key] and 'Network Traffic Content' in tech['data_components']:
+                    tech['data_components'].remove('Network Traffic Content')
+
+                # Remove 'Network Traffic Content' from the DeTT&CT data sources list when having both DeTT&CT data sources ánd 'Network Traffic Content'.
+                # That's the case where we keep 'Network Traffic Content' in the data components list.
+                if 'Network Traffic Content' in dds[dds_key]:
+                    tech[dds_key].remove('Network Traffic Content')
 
         attack_data.append(tech)
     
@@ -137,6 +162,25 @@ def _convert_stix_campaigns_to_dict(stix_attack_data):
     return attack_data
 
 
+def _get_uses_relationships(target_type):
+    """
+    Get the 'uses' relationships towards techniques or software, indexed on their source_ref. All relationships are
+    partitioned only once per process, to prevent scanning all relationships for every custom data type and STIX object.
+    :param target_type: the type of the target objects: 'technique' or 'software'
+    :return: dictionary with the source_ref as key and a list of relationships (in their original order) as value
+    """
+    global _uses_relationships
+    if _uses_relationships is None:
+        _uses_relationships = {'technique': defaultdict(list), 'software': defaultdict(list)}
+        for r in load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS):
+            if r['relationship_type'] == 'uses':
+                if r['target_ref'].startswith('attack-pattern--'):
+                    _uses_relationships['technique'][r['source_ref']].append(r)
+                elif r['target_ref'].startswith(('tool--', 'malware--')):
+                    _uses_relationships['software'][r['source_ref']].append(r)
+    return _uses_relationships[target_type]
+
+
 def load_attack_data(data_type):
     """
     By default the ATT&CK data is loaded from the online TAXII server or from the local cache directory. The
@@ -146,31 +190,43 @@ def load_attack_data(data_type):
     :param data_type: the desired data type, see DATATYPE_XX constants.
     :return: MITRE ATT&CK data object (STIX or custom schema)
     """
+    # the ATT&CK data does not change during the lifetime of the process, so there is no need to load it more than once
+    if data_type in _attack_data_memory_cache:
+        return _attack_data_memory_cache[data_type]
+
+    global _attack_client_instance
     from attackcti import attack_client
     if local_stix_path is not None:
-        if local_stix_path is not None and os.path.isdir(os.path.join(local_stix_path, 'enterprise-attack')) \
-                and os.path.isdir(os.path.join(local_stix_path, 'ics-attack')) \
-                and os.path.isdir(os.path.join(local_stix_path, 'mobile-attack')):
-            mitre = attack_client(local_path=local_stix_path)
-        else:
-            print('[!] Not a valid local STIX path: ' + local_stix_path)
-            quit()
-    else:
-        if os.path.exists("cache/" + data_type):
-            with open("cache/" + data_type, 'rb') as f:
-                cached = pickle.load(f)
-                write_time = cached[1]
-                if not (dt.now() - write_time).total_seconds() >= EXPIRE_TIME:
-                    # the first item in the list contains the ATT&CK data
-                    return cached[0]
-        try:
-            mitre = attack_client()
-        except (exceptions.ConnectionError, datastore.DataSourceError) as e:
-            if hasattr(e, 'request'):
-                print("[!] Cannot connect to MITRE's CTI TAXII server: " + str(e.request.url))
+        if _attack_client_instance is None:
+            if os.path.isdir(os.path.join(local_stix_path, 'enterprise-attack')) \
+                    and os.path.isdir(os.path.join(local_stix_path, 'ics-attack')) \
+                    and os.path.isdir(os.path.join(local_stix_path, 'mobile-attack')):
+                _attack_client_instance = attack_client(local_path=local_stix_path)
             else:
-                print("[!] Cannot connect to MITRE's CTI TAXII server")
-            quit()
+                print('[!] Not a valid local STIX path: ' + local_stix_path)
+                quit()
+        mitre = _attack_client_instance
+    else:
+        cache_file = "cache/" + data_type
+        # the modification time of the cache file tells if it is expired, so only a valid cache file is unpickled
+        if os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) < EXPIRE_TIME:
+            # reading the whole file at once and unpickling from memory is faster than unpickling from the file object
+            with open(cache_file, 'rb') as f:
+                cached_data = pickle.loads(f.read())
+            # cache files written by older versions contain [data, timestamp] and are refreshed
+            if not (isinstance(cached_data, (list, tuple)) and len(cached_data) == 2 and isinstance(cached_data[1], dt)):
+                _attack_data_memory_cache[data_type] = cached_data
+                return cached_data
+        if _attack_client_instance is None:
+            try:
+                _attack_client_instance = attack_client()
+            except (exceptions.ConnectionError, datastore.DataSourceError) as e:
+                if hasattr(e, 'request'):
+                    print("[!] Cannot connect to MITRE's CTI TAXII server: " + str(e.request.url))
+                else:
+                    print("[!] Cannot connect to MITRE's CTI TAXII server")
+                quit()
+        mitre = _attack_client_instance
 
     attack_data = None
     if data_type == DATA_TYPE_STIX_ALL_RELATIONSHIPS:
@@ -188,76 +244,72 @@ def load_attack_data(data_type):
         # First we need to know which technique references (STIX Object type 'attack-pattern') we have for all
         # groups. This results in a dict: {group_id: Gxxxx, technique_ref/attack-pattern_ref: ...}
         groups = load_attack_data(DATA_TYPE_STIX_ALL_GROUPS)
-        relationships = load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS)
+        uses_relationships = _get_uses_relationships('technique')
         all_groups_relationships = []
         for g in groups:
-            for r in relationships:
-                if g['id'] == r['source_ref'] and r['relationship_type'] == 'uses' and \
-                        r['target_ref'].startswith('attack-pattern--'):
-                    # much more information on the group can be added. Only the minimal required data is now added.
-                    all_groups_relationships.append(
-                        {
-                            'group_id': get_attack_id(g),
-                            'name': g['name'],
-                            'aliases': g.get('aliases', None),
-                            'technique_ref': r['target_ref'],
-                            'x_mitre_domains': g['x_mitre_domains'] if 'x_mitre_domains' in g.keys() else ['enterprise-attack']
-                        })
+            for r in uses_relationships.get(g['id'], []):
+                # much more information on the group can be added. Only the minimal required data is now added.
+                all_groups_relationships.append(
+                    {
+                        'group_id': get_attack_id(g),
+                        'name': g['name'],
+                        'aliases': g.get('aliases', None),
+                        'technique_ref': r['target_ref'],
+                        'x_mitre_domains': g['x_mitre_domains'] if 'x_mitre_domains' in g.keys() else ['enterprise-attack']
+                    })
 
         # Now we start resolving this part of the dict created above: 'technique_ref/attack-pattern_ref'.
         # and we add some more data to the final result.
         all_group_use = []
-        techniques = load_attack_data(DATA_TYPE_STIX_ALL_TECH)
+        techniques_by_id = {t['id']: t for t in load_attack_data(DATA_TYPE_STIX_ALL_TECH)}
         for gr in all_groups_relationships:
-            for t in techniques:
-                if t['id'] == gr['technique_ref']:
-                    all_group_use.append(
-                        {
-                            'group_id': gr['group_id'],
-                            'name': gr['name'],
-                            'aliases': gr['aliases'],
-                            'technique_id': get_attack_id(t),
-                            'x_mitre_platforms': t.get('x_mitre_platforms', None),
-                            'x_mitre_domains': gr['x_mitre_domains'],
-                            'matrix': t['external_references'][0]['source_name']
-                        })
+            t = techniques_by_id.get(gr['technique_ref'])
+            if t:
+                all_group_use.append(
+                    {
+                        'group_id': gr['group_id'],
+                        'name': gr['name'],
+                        'aliases': gr['aliases'],
+                        'technique_id': get_attack_id(t),
+                        'x_mitre_platforms': t.get('x_mitre_platforms', None),
+                        'x_mitre_domains': gr['x_mitre_domains'],
+                        'matrix': t['external_references'][0]['source_name']
+                    })
 
         attack_data = all_group_use
     elif data_type == DATA_TYPE_CUSTOM_TECH_IN_CAMPAIGN:
         # First we need to know which technique references (STIX Object type 'attack-pattern') we have for all
         # campaigns. This results in a dict: {campaign_id: Cxxxx, technique_ref/attack-pattern_ref: ...}
         campaigns = load_attack_data(DATA_TYPE_STIX_ALL_CAMPAIGNS)
-        relationships = load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS)
+        uses_relationships = _get_uses_relationships('technique')
         all_campaigns_relationships = []
         for c in campaigns:
-            for r in relationships:
-                if c['id'] == r['source_ref'] and r['relationship_type'] == 'uses' and \
-                        r['target_ref'].startswith('attack-pattern--'):
-                    # more information on the campaign can be added. Only the minimal required data is added.
-                    all_campaigns_relationships.append(
-                        {
-                            'campaign_id': get_attack_id(c),
-                            'name': c['name'],
-                            'technique_ref': r['target_ref'],
-                            'x_mitre_domains': c['x_mitre_domains'] if 'x_mitre_domains' in c.keys() else ['enterprise-attack']
-                        })
+            for r in uses_relationships.get(c['id'], []):
+                # more information on the campaign can be added. Only the minimal required data is added.
+                all_campaigns_relationships.append(
+                    {
+                        'campaign_id': get_attack_id(c),
+                        'name': c['name'],
+                        'technique_ref': r['target_ref'],
+                        'x_mitre_domains': c['x_mitre_domains'] if 'x_mitre_domains' in c.keys() else ['enterprise-attack']
+                    })
 
         # Now we start resolving this part of the dict created above: 'technique_ref/attack-pattern_ref'.
         # and we add some more data to the final result.
         all_campaigns_use = []
-        techniques = load_attack_data(DATA_TYPE_STIX_ALL_TECH)
+        techniques_by_id = {t['id']: t for t in load_attack_data(DATA_TYPE_STIX_ALL_TECH)}
         for cr in all_campaigns_relationships:
-            for t in techniques:
-                if t['id'] == cr['technique_ref']:
-                    all_campaigns_use.append(
-                        {
-                            'campaign_id': cr['campaign_id'],
-                            'name': cr['name'],
-                            'technique_id': get_attack_id(t),
-                            'x_mitre_platforms': t.get('x_mitre_platforms', None),
-                            'x_mitre_domains': cr['x_mitre_domains'],
-                            'matrix': t['external_references'][0]['source_name']
-                        })
+            t = techniques_by_id.get(cr['technique_ref'])
+            if t:
+                all_campaigns_use.append(
+                    {
+                        'campaign_id': cr['campaign_id'],
+                        'name': cr['name'],
+                        'technique_id': get_attack_id(t),
+                        'x_mitre_platforms': t.get('x_mitre_platforms', None),
+                        'x_mitre_domains': cr['x_mitre_domains'],
+                        'matrix': t['external_references'][0]['source_name']
+                    })
 
         attack_data = all_campaigns_use
 
@@ -295,25 +347,23 @@ def load_attack_data(data_type):
         # First we need to know which technique references (STIX Object type 'attack-pattern') we have for all software
         # This results in a dict: {software_id: Sxxxx, technique_ref/attack-pattern_ref: ...}
         software = load_attack_data(DATA_TYPE_STIX_ALL_SOFTWARE)
-        relationships = load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS)
+        uses_relationships = _get_uses_relationships('technique')
         all_software_relationships = []
         for s in software:
-            for r in relationships:
-                if s['id'] == r['source_ref'] and r['relationship_type'] == 'uses' and \
-                        r['target_ref'].startswith('attack-pattern--'):
-                    # much more information (e.g. description, aliases, platform) on the software can be added to the
-                    # dict if necessary. Only the minimal required data is now added.
-                    all_software_relationships.append({'software_id': get_attack_id(s), 'technique_ref': r['target_ref']})
+            for r in uses_relationships.get(s['id'], []):
+                # much more information (e.g. description, aliases, platform) on the software can be added to the
+                # dict if necessary. Only the minimal required data is now added.
+                all_software_relationships.append({'software_id': get_attack_id(s), 'technique_ref': r['target_ref']})
 
         # Now we start resolving this part of the dict created above: 'technique_ref/attack-pattern_ref'
-        techniques = load_attack_data(DATA_TYPE_STIX_ALL_TECH)
+        techniques_by_id = {t['id']: t for t in load_attack_data(DATA_TYPE_STIX_ALL_TECH)}
         all_software_use = []
         for sr in all_software_relationships:
-            for t in techniques:
-                if t['id'] == sr['technique_ref']:
-                    # much more information on the technique can be added to the dict. Only the minimal required data
-                    # is now added (i.e. resolving the technique ref to an actual ATT&CK ID)
-                    all_software_use.append({'software_id': sr['software_id'], 'technique_id': get_attack_id(t)})
+            t = techniques_by_id.get(sr['technique_ref'])
+            if t:
+                # much more information on the technique can be added to the dict. Only the minimal required data
+                # is now added (i.e. resolving the technique ref to an actual ATT&CK ID)
+                all_software_use.append({'software_id': sr['software_id'], 'technique_id': get_attack_id(t)})
 
         attack_data = all_software_use
 
@@ -321,75 +371,71 @@ def load_attack_data(data_type):
         # First we need to know which software references (STIX Object type 'malware' or 'tool') we have for all
         # groups. This results in a dict: {group_id: Gxxxx, software_ref/malware-tool_ref: ...}
         groups = load_attack_data(DATA_TYPE_STIX_ALL_GROUPS)
-        relationships = load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS)
+        uses_relationships = _get_uses_relationships('software')
         all_groups_relationships = []
         for g in groups:
-            for r in relationships:
-                if g['id'] == r['source_ref'] and r['relationship_type'] == 'uses' and \
-                        (r['target_ref'].startswith('tool--') or r['target_ref'].startswith('malware--')):
-                    # much more information on the group can be added. Only the minimal required data is now added.
-                    all_groups_relationships.append(
-                        {
-                            'group_id': get_attack_id(g),
-                            'name': g['name'],
-                            'aliases': g.get('aliases', None),
-                            'software_ref': r['target_ref'],
-                            'x_mitre_domains': g['x_mitre_domains']
-                        })
+            for r in uses_relationships.get(g['id'], []):
+                # much more information on the group can be added. Only the minimal required data is now added.
+                all_groups_relationships.append(
+                    {
+                        'group_id': get_attack_id(g),
+                        'name': g['name'],
+                        'aliases': g.get('aliases', None),
+                        'software_ref': r['target_ref'],
+                        'x_mitre_domains': g['x_mitre_domains']
+                    })
 
         # Now we start resolving this part of the dict created above: 'software_ref/malware-tool_ref'.
         # and we add some more data to the final result.
         all_group_use = []
-        software = load_attack_data(DATA_TYPE_STIX_ALL_SOFTWARE)
+        software_by_id = {s['id']: s for s in load_attack_data(DATA_TYPE_STIX_ALL_SOFTWARE)}
         for gr in all_groups_relationships:
-            for s in software:
-                if s['id'] == gr['software_ref']:
-                    all_group_use.append(
-                        {
-                            'group_id': gr['group_id'],
-                            'name': gr['name'],
-                            'aliases': gr['aliases'],
-                            'software_id': get_attack_id(s),
-                            'x_mitre_platforms': s.get('x_mitre_platforms', None),
-                            'x_mitre_domains': gr['x_mitre_domains'],
-                            'matrix': s['external_references'][0]['source_name']
-                        })
+            s = software_by_id.get(gr['software_ref'])
+            if s:
+                all_group_use.append(
+                    {
+                        'group_id': gr['group_id'],
+                        'name': gr['name'],
+                        'aliases': gr['aliases'],
+                        'software_id': get_attack_id(s),
+                        'x_mitre_platforms': s.get('x_mitre_platforms', None),
+                        'x_mitre_domains': gr['x_mitre_domains'],
+                        'matrix': s['external_references'][0]['source_name']
+                    })
         attack_data = all_group_use
 
     elif data_type == DATA_TYPE_CUSTOM_SOFTWARE_IN_CAMPAIGN:
         # First we need to know which software references (STIX Object type 'malware' or 'tool') we have for all
         # campaigns. This results in a dict: {campaign_id: Cxxxx, software_ref/malware-tool_ref: ...}
         campaigns = load_attack_data(DATA_TYPE_STIX_ALL_CAMPAIGNS)
-        relationships = load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS)
+        uses_relationships = _get_uses_relationships('software')
         all_campaigns_relationships = []
         for campaign in campaigns:
-            for r in relationships:
-                if campaign['id'] == r['source_ref'] and r['relationship_type'] == 'uses' and \
-                        (r['target_ref'].startswith('tool--') or r['target_ref'].startswith('malware--')):
-                    all_campaigns_relationships.append(
-                        {
-                            'campaign_id': get_attack_id(campaign),
-                            'name': campaign['name'],
-                            'software_ref': r['target_ref'],
-                            'x_mitre_domains': campaign['x_mitre_domains']
-                        })
+            for r in uses_relationships.get(campaign['id'], []):
+                all_campaigns_relationships.append(
+                    {
+                        'campaign_id': get_attack_id(campaign),
+                        'name': campaign['name'],
+                        'software_ref': r['target_ref'],
+                        'x_mitre_domains': campaign['x_mitre_domains']
+                    })
 
         # Now we start resolving this part of the dict created above: 'software_ref/malware-tool_ref'.
         # and we add some more data to the final result.
         all_campaign_use = []
-        software = load_attack_data(DATA_TYPE_STIX_ALL_SOFTWARE)
+        software_by_id = {s['id']: s for s in load_attack_data(DATA_TYPE_STIX_ALL_SOFTWARE)}
         for campaign in all_campaigns_relationships:
-            for s in software:
-                if s['id'] == campaign['software_ref']:
-                    all_campaign_use.append(
-                        {
-                            'campaign_id': campaign['campaign_id'],
-                            'name': campaign['name'],
-                            'software_id': get_attack_id(s),
-                            'x_mitre_platforms': s.get('x_mitre_platforms', None),
-                            'x_mitre_domains': campaign['x_mitre_domains'],
-                            'matrix': s['external_references'][0]['source_name']
-                        })
+            s = software_by_id.get(campaign['software_ref'])
+            if s:
+                all_campaign_use.append(
+                    {
+                        'campaign_id': campaign['campaign_id'],
+                        'name': campaign['name'],
+                        'software_id': get_attack_id(s),
+                        'x_mitre_platforms': s.get('x_mitre_platforms', None),
+                        'x_mitre_domains': campaign['x_mitre_domains'],
+                        'matrix': s['external_references'][0]['source_name']
+                    })
         attack_data = all_campaign_use
 
     elif data_type == DATA_TYPE_STIX_ALL_ENTERPRISE_MITIGATIONS:
@@ -408,17 +454,53 @@ def load_attack_data(data_type):
     if local_stix_path is None:
         _save_attack_data(attack_data, "cache/" + data_type)
 
+    _attack_data_memory_cache[data_type] = attack_data
     return attack_data
 
 
 def init_yaml():
     """
-    Initialize ruamel.yaml with the correct settings
+    Initialize ruamel.yaml with the correct settings. The instance is only created once, as it can be reused for
+    every load and dump.
     :return: a ruamel.yaml object
     """
-    _yaml = YAML()
-    _yaml.Representer.ignore_aliases = lambda *args: True  # disable anchors/aliases
-    return _yaml
+    global _yaml_instance
+    if _yaml_instance is None:
+        _yaml_instance = YAML()
+        _yaml_instance.Representer.ignore_aliases = lambda *args: True  # disable anchors/aliases
+    return _yaml_instance
+
+
+def init_yaml_safe():
+    """
+    Initialize ruamel.yaml with the safe loader, which makes use of the (much faster) libyaml C loader when available.
+    Comments and formatting are not preserved, so only use this for YAML files that are read and not written back.
+    :return: a ruamel.yaml object
+    """
+    global _yaml_safe_instance
+    if _yaml_safe_instance is None:
+        _yaml_safe_instance = YAML(typ='safe')
+    return _yaml_safe_instance
+
+
+def load_yaml_file(filename):
+    """
+    Load a YAML file with ruamel.yaml. The parsed content is cached for as long as the file is not modified, as the same
+    file is often loaded multiple times (e.g. file type check, health check and the actual loading of the content).
+    A copy is returned because callers may modify the content.
+    :param filename: YAML file location
+    :return: the YAML content
+    """
+    stat = os.stat(filename)
+    file_version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _yaml_file_cache.get(filename)
+    if cached is None or cached[0] != file_version:
+        with open(filename, 'r') as yaml_file:
+            cached = (file_version, init_yaml().load(yaml_file))
+        _yaml_file_cache[filename] = cached
+
+    return deepcopy(cached[1])
 
 
 def get_attack_id(stix_obj):
@@ -427,9 +509,18 @@ def get_attack_id(stix_obj):
     :param stix_obj: STIX object (Technique, Software or Group)
     :return: ATT&CK ID
     """
+    stix_id = stix_obj['id']
+    if stix_id in _attack_id_cache:
+        return _attack_id_cache[stix_id]
+
+    attack_id = None
     for ext_ref in stix_obj['external_references']:
         if ext_ref['source_name'] in ['mitre-attack', 'mitre-mobile-attack', 'mitre-ics-attack']:
-            return ext_ref['external_id']
+            attack_id = ext_ref['external_id']
+            break
+
+    _attack_id_cache[stix_id] = attack_id
+    return attack_id
 
 
 def get_tactics(technique):
@@ -466,11 +557,11 @@ def ask_yes_no(question):
     :return: boolean value indicating a yes (True) or no (False0
     """
     yes_no = ''
-    while not re.match('^(y|yes|n|no)$', yes_no, re.IGNORECASE):
+    while not REGEX_YES_NO.match(yes_no):
         yes_no = input(question + '\n >>   y(yes) / n(no): ')
         print('')
 
-    if re.match('^(y|yes)$', yes_no, re.IGNORECASE):
+    if REGEX_YES.match(yes_no):
         return True
     else:
         return False
@@ -492,7 +583,8 @@ def ask_multiple_choice(question, list_answers):
         x += 1
 
     # noinspection Annotator
-    while not re.match('(^[1-' + str(len(list_answers)) + ']{1}$)', answer):
+    regex_answer = re.compile('(^[1-' + str(len(list_answers)) + ']{1}$)')
+    while not regex_answer.match(answer):
         print(question)
         print(answers)
         answer = input(' >>   ')
@@ -501,31 +593,38 @@ def ask_multiple_choice(question, list_answers):
     return int(answer)
 
 
-def fix_date_and_remove_null(yaml_file, date, input_type='ruamel'):
+def fix_date_and_remove_null(yaml_file, date, input_type='ruamel', output=None):
     """
     Remove the single quotes around the date key-value pair in the provided yaml_file and remove any 'null' values
-    :param yaml_file: ruamel.yaml instance or location of YAML file
+    :param yaml_file: ruamel.yaml instance, list of lines or file object of the YAML file
     :param date: string date value (e.g. 2019-01-01)
-    :param input_type: input type can be a ruamel.yaml instance or list
-    :return: YAML file lines in a list
+    :param input_type: input type can be a ruamel.yaml instance, list or file
+    :param output: optional file object to which the fixed lines are written one by one, instead of returning them
+    :return: YAML file lines in a list, or None when an output file object is provided
     """
-    _yaml = init_yaml()
     if input_type == 'ruamel':
-        # ruamel does not support output to a variable. Therefore we make use of StringIO.
+        # ruamel does not support output to a variable. Therefore we make use of StringIO, and split its content
+        # into lines in one go.
+        _yaml = init_yaml()
         file = StringIO()
         _yaml.dump(yaml_file, file)
-        file.seek(0)
-        new_lines = file.readlines()
+        new_lines = file.getvalue().splitlines(keepends=True)
     elif input_type == 'list':
         new_lines = yaml_file
     elif input_type == 'file':
-        new_lines = yaml_file.readlines()
+        new_lines = yaml_file
 
-    fixed_lines = [l.replace('\'' + str(date) + '\'', str(date)).replace('null', '')
+    date_str = str(date)
+    quoted_date = '\'' + date_str + '\''
+    fixed_lines = (l.replace(quoted_date, date_str).replace('null', '')
                    if REGEX_YAML_DATE.match(l) else
-                   l.replace('null', '') for l in new_lines]
+                   l.replace('null', '') for l in new_lines)
 
-    return fixed_lines
+    if output:
+        # stream the lines to the output file to prevent having yet another copy of the file in memory
+        output.writelines(fixed_lines)
+    else:
+        return list(fixed_lines)
 
 
 def get_latest_score_obj(yaml_object):
@@ -538,17 +637,9 @@ def get_latest_score_obj(yaml_object):
         yaml_object['score_logbook'] = [yaml_object['score_logbook']]
 
     if len(yaml_object['score_logbook']) > 0 and 'date' in yaml_object['score_logbook'][0]:
-        # for some weird reason 'sorted()' provides inconsistent results
-        newest_score_obj = None
-        newest_date = None
-        for score_obj in yaml_object['score_logbook']:
-            score_obj_date = score_obj['date']
-
-            if not newest_score_obj or (score_obj_date and score_obj_date > newest_date):
-                newest_date = score_obj_date
-                newest_score_obj = score_obj
-
-        return newest_score_obj
+        # score objects without a date are considered to be the oldest. When multiple score objects have the same
+        # date, max() returns the first one.
+        return max(yaml_object['score_logbook'], key=lambda score_obj: (score_obj['date'] is not None, score_obj['date']))
     else:
         return None
 
@@ -611,6 +702,20 @@ def get_latest_score(yaml_object):
         return None
 
 
+def get_latest_score_values(yaml_object):
+    """
+    Return the latest score, date, comment and auto_generated value present in the score_logbook. Use this function
+    when more than one of these values is needed, to look up the latest score object only once.
+    :param yaml_object: a detection or visibility YAML object
+    :return: tuple with the score, date, comment and auto_generated value (same values as the get_latest_xx functions)
+    """
+    score_obj = get_latest_score_obj(yaml_object)
+    if score_obj:
+        return score_obj['score'], score_obj['date'], score_obj['comment'] or '', score_obj.get('auto_generated', False)
+    else:
+        return None, None, '', False
+
+
 def platform_to_name(platform, domain, separator='-'):
     """
     Makes a filename friendly version of the platform parameter which can be a string or list.
@@ -635,11 +740,8 @@ def get_applicable_data_sources_platform(platforms, domain):
     :param domain: the specified domain
     :return: a list of applicable ATT&CK data sources
     """
-    applicable_data_sources = set()
-
     data_sources = DATA_SOURCES_ENTERPRISE if domain == 'enterprise-attack' else DATA_SOURCES_ICS if domain == 'ics-attack' else DATA_SOURCES_MOBILE
-    for p in platforms:
-        applicable_data_sources.update(data_sources[p])
+    applicable_data_sources = set(chain.from_iterable(data_sources[p] for p in platforms))
 
     return list(applicable_data_sources)
 
@@ -651,11 +753,8 @@ def get_applicable_dettect_data_sources_platform(platforms, domain):
     :param domain: the specified domain
     :return: a list of applicable ATT&CK data sources
     """
-    applicable_dettect_data_sources = set()
-
     dettect_data_sources = DETTECT_DATA_SOURCES_PLATFORMS_ENTERPRISE if domain == 'enterprise-attack' else DETTECT_DATA_SOURCES_PLATFORMS_ICS if domain == 'ics-attack' else DETTECT_DATA_SOURCES_PLATFORMS_MOBILE
-    for p in platforms:
-        applicable_dettect_data_sources.update(dettect_data_sources[p])
+    applicable_dettect_data_sources = set(chain.from_iterable(dettect_data_sources[p] for p in platforms))
 
     return list(applicable_dettect_data_sources)
 
@@ -667,11 +766,7 @@ def get_applicable_data_sources_technique(technique_data_sources, platform_appli
     :param platform_applicable_data_sources: a list of applicable ATT&CK data sources based on 'DATA_SOURCES'
     :return: a list of applicable data sources
     """
-    applicable_data_sources = set()
-
-    for ds in technique_data_sources:
-        if ds in platform_applicable_data_sources:
-            applicable_data_sources.add(ds)
+    applicable_data_sources = {ds for ds in technique_data_sources if ds in platform_applicable_data_sources}
 
     return list(applicable_data_sources)
 
@@ -683,11 +778,7 @@ def get_applicable_dettect_data_sources_technique(technique_dettect_data_sources
     :param platform_applicable_data_sources: a list of applicable DeTT&CT data sources based on 'DETTECT_DATA_SOURCES_PLATFORMS'
     :return: a list of applicable data sources
     """
-    applicable_dettect_data_sources = set()
-
-    for ds in technique_dettect_data_sources:
-        if ds in platform_applicable_dettect_data_sources:
-            applicable_dettect_data_sources.add(ds)
+    applicable_dettect_data_sources = {ds for ds in technique_dettect_data_sources if ds in platform_applicable_dettect_data_sources}
 
     return list(applicable_dettect_data_sources)
 
@@ -720,7 +811,7 @@ def load_data_sources(file, filter_empty_scores=True):
         yaml_content = file
     else:
         # file is a file location on disk
-        _yaml = init_yaml()
+        _yaml = init_yaml_safe()
         with open(file, 'r') as yaml_file:
             yaml_content = _yaml.load(yaml_file)
 
@@ -789,32 +880,20 @@ def load_techniques(file):
         yaml_content = file
     else:
         # file is a file location on disk
-        _yaml = init_yaml()
-        with open(file, 'r') as yaml_file:
-            yaml_content = _yaml.load(yaml_file)
+        yaml_content = load_yaml_file(file)
 
     yaml_content = _traverse_modify_date(yaml_content)
 
     for d in yaml_content['techniques']:
-        if 'detection' in d:
-            # Add detection items:
-            if isinstance(d['detection'], dict):  # There is just one detection entry
-                d['detection'] = set_yaml_dv_comments(d['detection'])
-                _add_entry_to_list_in_dictionary(my_techniques, d['technique_id'], 'detection', d['detection'])
-            elif isinstance(d['detection'], list):  # There are multiple detection entries
-                for de in d['detection']:
-                    de = set_yaml_dv_comments(de)
-                    _add_entry_to_list_in_dictionary(my_techniques, d['technique_id'], 'detection', de)
-
-        if 'visibility' in d:
-            # Add visibility items
-            if isinstance(d['visibility'], dict):  # There is just one visibility entry
-                d['visibility'] = set_yaml_dv_comments(d['visibility'])
-                _add_entry_to_list_in_dictionary(my_techniques, d['technique_id'], 'visibility', d['visibility'])
-            elif isinstance(d['visibility'], list):  # There are multiple visibility entries
-                for de in d['visibility']:
-                    de = set_yaml_dv_comments(de)
-                    _add_entry_to_list_in_dictionary(my_techniques, d['technique_id'], 'visibility', de)
+        # Add detection and visibility items:
+        for obj_type in ['detection', 'visibility']:
+            if obj_type in d:
+                entries = d[obj_type]
+                if isinstance(entries, dict):  # There is just one entry
+                    entries = [entries]
+                elif not isinstance(entries, list):
+                    continue
+                my_techniques.setdefault(d['technique_id'], {}).setdefault(obj_type, []).extend(map(set_yaml_dv_comments, entries))
 
     name = yaml_content['name']
     domain = 'enterprise-attack' if 'domain' not in yaml_content.keys() else yaml_content['domain']
@@ -830,15 +909,9 @@ def calculate_score(list_yaml_objects, zero_value=0):
     :param zero_value: the value when no scores are there, default 0
     :return: average score
     """
-    avg_score = 0
-    number = 0
-    for v in list_yaml_objects:
-        score = get_latest_score(v)
-        if score is not None and score >= 0:
-            avg_score += score
-            number += 1
+    scores = [score for score in map(get_latest_score, list_yaml_objects) if score is not None and score >= 0]
 
-    avg_score = int(round(avg_score / number, 0) if number > 0 else zero_value)
+    avg_score = int(round(sum(scores) / len(scores), 0) if scores else zero_value)
     return avg_score
 
 
@@ -852,11 +925,7 @@ def _add_entry_to_list_in_dictionary(dictionary, key_dict, key_list, entry):
     :param entry: the entry to add to the list
     :return:
     """
-    if key_dict not in dictionary.keys():
-        dictionary[key_dict] = {}
-    if key_list not in dictionary[key_dict].keys():
-        dictionary[key_dict][key_list] = []
-    dictionary[key_dict][key_list].append(entry)
+    dictionary.setdefault(key_dict, {}).setdefault(key_list, []).append(entry)
 
 
 def set_yaml_dv_comments(yaml_object):
@@ -924,36 +993,33 @@ def _check_file_type(filename, file_type=None):
     :param file_type: value to check against the 'file_type' key in the YAML file
     :return: the file_type if present, else None is returned
     """
-    if not os.path.exists(filename):
+    try:
+        yaml_content = load_yaml_file(filename)
+    except FileNotFoundError:
         print('[!] File: \'' + filename + '\' does not exist')
         return None
+    except Exception as e:
+        print('[!] File: \'' + filename + '\' is not a valid YAML file.')
+        print('  ' + str(e))  # print more detailed error information to help the user in fixing the error.
+        return None
 
-    _yaml = init_yaml()
-    with open(filename, 'r') as yaml_file:
-        try:
-            yaml_content = _yaml.load(yaml_file)
-        except Exception as e:
-            print('[!] File: \'' + filename + '\' is not a valid YAML file.')
-            print('  ' + str(e))  # print more detailed error information to help the user in fixing the error.
-            return None
-
-        # This check is performed because a text file will also be considered to be valid YAML. But, we are using
-        # key-value pairs within the YAML files.
-        if not hasattr(yaml_content, 'keys'):
-            print('[!] File: \'' + filename + '\' is not a valid YAML file.')
-            return None
+    # This check is performed because a text file will also be considered to be valid YAML. But, we are using
+    # key-value pairs within the YAML files.
+    if not hasattr(yaml_content, 'keys'):
+        print('[!] File: \'' + filename + '\' is not a valid YAML file.')
+        return None
 
-        if 'file_type' not in yaml_content.keys():
-            print('[!] File: \'' + filename + '\' does not contain a file_type key.')
+    if 'file_type' not in yaml_content.keys():
+        print('[!] File: \'' + filename + '\' does not contain a file_type key.')
+        return None
+    elif file_type:
+        if file_type != yaml_content['file_type']:
+            print('[!] File: \'' + filename + '\' is not a file type of: \'' + file_type + '\'')
             return None
-        elif file_type:
-            if file_type != yaml_content['file_type']:
-                print('[!] File: \'' + filename + '\' is not a file type of: \'' + file_type + '\'')
-                return None
-            else:
-                return yaml_content
         else:
             return yaml_content
+    else:
+        return yaml_content
 
 
 def _check_for_old_data_sources(filename):
@@ -962,7 +1028,7 @@ def _check_for_old_data_sources(filename):
     :param filename: path to data source YAML file
     :return: True if no ATT&CK v8 data sources are found, else False is returned
     """
-    _yaml = init_yaml()
+    _yaml = init_yaml_safe()
     with open(filename, 'r') as yaml_file:
         yaml_content = _yaml.load(yaml_file)
 
@@ -1058,9 +1124,7 @@ def check_platform(arg_platforms, filename=None, domain=None):
     :return: true if the platform(s) are valid, otherwise false
     """
     if filename:
-        _yaml = init_yaml()
-        with open(filename, 'r') as yaml_file:
-            yaml_content = _yaml.load(yaml_file)
+        yaml_content = load_yaml_file(filename)
 
         domain = 'enterprise-attack' if 'domain' not in yaml_content.keys() else yaml_content['domain'].lower()
     elif domain and not domain.endswith('-attack'):
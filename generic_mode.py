@@ -1,6 +1,7 @@
 from generic import load_attack_data, get_attack_id, get_tactics, get_applicable_data_sources_platform, get_applicable_dettect_data_sources_platform
 from constants import *
 from textwrap import wrap
+from collections import Counter
 
 
 def _get_platforms_for_data_source(data_source, domain):
@@ -50,15 +51,16 @@ def get_statistics_data_sources(domain, arg_platforms):
         applicable_data_sources = set(get_applicable_data_sources_platform(arg_platforms, domain + '-attack'))
         applicable_data_sources.update(get_applicable_dettect_data_sources_platform(arg_platforms, domain + '-attack'))
 
-    # {data_source: {techniques: [T0001, ...], count: ..., platforms: []}
-    data_sources_dict = {}
+    # number of techniques per data source: {data_source: count}
+    data_sources_count = Counter()
+    # {data_source: [platform, ...]}
+    data_sources_platforms = {}
     for tech in techniques:
         # only continue if one of the below statements is valid:
         #  - arg_platforms == None (no platform filtering has been provide via cli arguments by the user)
         #  - there are platforms in the technique, which are also in arg_platforms
         tech_platforms = set(tech.get('x_mitre_platforms', []))
         if arg_platforms is None or arg_platforms.intersection(tech_platforms):
-            tech_id = tech['technique_id']
             data_sources = tech['data_components']
 
             dettect_data_sources = tech.get('dettect_data_sources', [])
@@ -71,29 +73,25 @@ def get_statistics_data_sources(domain, arg_platforms):
                     if ds_component not in applicable_data_sources:
                         continue
 
-                if ds not in data_sources_dict:
+                if ds not in data_sources_platforms:
                     platforms = _get_platforms_for_data_source(ds_component, domain)
                     if arg_platforms != None:
                         platforms = list(set(platforms).intersection(arg_platforms))
-                    data_sources_dict[ds] = {'techniques': [tech_id], 'count': 1, 'platforms': platforms}
-                else:
-                    data_sources_dict[ds]['techniques'].append(tech_id)
-                    data_sources_dict[ds]['count'] += 1
+                    data_sources_platforms[ds] = platforms
+                data_sources_count[ds] += 1
 
-    # sort the dict on the value of 'count'
-    data_sources_dict_sorted = dict(sorted(data_sources_dict.items(), key=lambda kv: kv[1]['count'], reverse=True))
     str_format = '{:<6s} {:<40s} {:s}'    
     print(str_format.format('Count', 'Data Source', 'Platform(s)'))
     print('-' * 120)
-    for k, v in data_sources_dict_sorted.items():
+    for k, count in data_sources_count.most_common():
         data_source = k
         if ':' in k:
             data_source = k.split(':')[1][1:].lstrip().rstrip()
 
-        platforms = ', '.join(v['platforms'])
+        platforms = ', '.join(data_sources_platforms[k])
         platforms = wrap(platforms, 70, break_long_words=False)
 
-        print(str_format.format(str(v['count']), data_source, platforms[0]))
+        print(str_format.format(str(count), data_source, platforms[0]))
         for p in platforms[1:]:
             print(' ' * 48 + p)
 
@@ -112,38 +110,28 @@ def get_statistics_mitigations(domain):
     elif domain == 'ics':
         mitigations = load_attack_data(DATA_TYPE_STIX_ALL_ICS_MITIGATIONS)
 
-    mitigations_dict = dict()
+    # {stix_id: mitigation_id} and {mitigation_id: name}
+    mitigation_ids = dict()
+    mitigation_names = dict()
     for m in mitigations:
-        if m['external_references'][0]['external_id'].startswith('M'):
-            mitigations_dict[m['id']] = {'mID': m['external_references'][0]['external_id'], 'name': m['name']}
+        mitigation_id = m['external_references'][0]['external_id']
+        if mitigation_id.startswith('M'):
+            mitigation_ids[m['id']] = mitigation_id
+            mitigation_names[mitigation_id] = m['name']
 
     relationships = load_attack_data(DATA_TYPE_STIX_ALL_RELATIONSHIPS)
-    relationships_mitigates = [r for r in relationships
-                               if r['relationship_type'] == 'mitigates'
-                               if r['source_ref'].startswith('course-of-action')
-                               if r['target_ref'].startswith('attack-pattern')
-                               if r['source_ref'] in mitigations_dict]
-
-    # {id: {name: ..., count: ..., name: ...} }
-    count_dict = dict()
-    for r in relationships_mitigates:
-        src_ref = r['source_ref']
-
-        m = mitigations_dict[src_ref]
-        if m['mID'] not in count_dict:
-            count_dict[m['mID']] = dict()
-            count_dict[m['mID']]['count'] = 1
-            count_dict[m['mID']]['name'] = m['name']
-        else:
-            count_dict[m['mID']]['count'] += 1
-
-    count_dict_sorted = dict(sorted(count_dict.items(), key=lambda kv: kv[1]['count'], reverse=True))
+
+    # number of mitigated techniques per mitigation ID (only course-of-action objects are part of mitigation_ids)
+    mitigations_count = Counter(mitigation_ids[r['source_ref']] for r in relationships
+                                if r['relationship_type'] == 'mitigates'
+                                if r['target_ref'].startswith('attack-pattern')
+                                if r['source_ref'] in mitigation_ids)
 
     str_format = '{:<6s} {:<14s} {:s}'
     print(str_format.format('Count', 'Mitigation ID', 'Name'))
     print('-' * 60)
-    for k, v in count_dict_sorted.items():
-        print(str_format.format(str(v['count']), k, v['name']))
+    for k, count in mitigations_count.most_common():
+        print(str_format.format(str(count), k, mitigation_names[k]))
 
 
 def get_platforms(domain):
@@ -167,6 +155,11 @@ def get_updates(update_type, sort='modified'):
     :return:
     """
     from pprint import pprint
+
+    # every update is formatted with a single f-string and all updates are printed at once
+    indent = '\n' + ' ' * 6
+    output = []
+
     if update_type[: -1] == 'technique':
         techniques = load_attack_data(DATA_TYPE_STIX_ALL_TECH)
         sorted_techniques = sorted(techniques, key=lambda k: k[sort])
@@ -174,42 +167,38 @@ def get_updates(update_type, sort='modified'):
         for t in sorted_techniques:
 
             if t['technique_id'] == None:
+                print(''.join(output), end='')
                 pprint(t)
                 quit()
 
-            print(t['technique_id'] + ' ' + t['name'])
-            print(' ' * 6 + 'created:  ' + t['created'].strftime('%Y-%m-%d'))
-            print(' ' * 6 + 'modified: ' + t['modified'].strftime('%Y-%m-%d'))
-            print(' ' * 6 + 'domain:   ' + t['external_references'][0]['source_name'][6:])
             tactics = get_tactics(t)
-            if tactics:
-                print(' ' * 6 + 'tactic:   ' + ', '.join(tactics))
-            else:
-                print(' ' * 6 + 'tactic:   None')
-            print('')
+            tactics = ', '.join(tactics) if tactics else 'None'
+            output.append(f"{t['technique_id']} {t['name']}"
+                          f"{indent}created:  {t['created']:%Y-%m-%d}"
+                          f"{indent}modified: {t['modified']:%Y-%m-%d}"
+                          f"{indent}domain:   {t['external_references'][0]['source_name'][6:]}"
+                          f"{indent}tactic:   {tactics}\n\n")
 
     elif update_type[: -1] == 'group':
         groups = load_attack_data(DATA_TYPE_STIX_ALL_GROUPS)
         sorted_groups = sorted(groups, key=lambda k: k[sort])
 
         for g in sorted_groups:
-            print(get_attack_id(g) + ' ' + g['name'])
-            print(' ' * 6 + 'created:  ' + g['created'].strftime('%Y-%m-%d'))
-            print(' ' * 6 + 'modified: ' + g['modified'].strftime('%Y-%m-%d'))
-            print('')
+            output.append(f"{get_attack_id(g)} {g['name']}"
+                          f"{indent}created:  {g['created']:%Y-%m-%d}"
+                          f"{indent}modified: {g['modified']:%Y-%m-%d}\n\n")
 
     elif update_type == 'software':
         software = load_attack_data(DATA_TYPE_STIX_ALL_SOFTWARE)
         sorted_software = sorted(software, key=lambda k: k[sort])
 
         for s in sorted_software:
-            print(get_attack_id(s) + ' ' + s['name'])
-            print(' ' * 6 + 'created:  ' + s['created'].strftime('%Y-%m-%d'))
-            print(' ' * 6 + 'modified: ' + s['modified'].strftime('%Y-%m-%d'))
-            print(' ' * 6 + 'domain:   ' + s['external_references'][0]['source_name'][6:])
-            print(' ' * 6 + 'type:     ' + s['type'])
-            if 'x_mitre_platforms' in s:
-                print(' ' * 6 + 'platform: ' + ', '.join(s['x_mitre_platforms']))
-            else:
-                print(' ' * 6 + 'platform: None')
-            print('')
+            platforms = ', '.join(s['x_mitre_platforms']) if 'x_mitre_platforms' in s else 'None'
+            output.append(f"{get_attack_id(s)} {s['name']}"
+                          f"{indent}created:  {s['created']:%Y-%m-%d}"
+                          f"{indent}modified: {s['modified']:%Y-%m-%d}"
+                          f"{indent}domain:   {s['external_references'][0]['source_name'][6:]}"
+                          f"{indent}type:     {s['type']}"
+                          f"{indent}platform: {platforms}\n\n")
+
+    print(''.join(output), end='')
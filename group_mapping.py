@@ -1,4 +1,3 @@
-import simplejson
 from eql_yaml import techniques_search
 from generic import *
 from navigator_layer import *
@@ -774,14 +773,12 @@ def generate_group_heat_map(groups, campaigns, overlay, overlay_type, platform,
     layer = get_layer_template_groups(layer_name, max_count, desc, platform, overlay_type, domain, layer_settings)
     layer['techniques'] = technique_layer
 
-    json_string = simplejson.dumps(layer).replace('}, ', '},\n')
-
     if not output_filename:
         filename = '_'.join(groups_list)
         if overlay:
             filename += '-overlay_' + '_'.join(overlay_list)
 
         filename = create_output_filename('attack', filename)
-        write_file(filename, json_string)
+        write_json_file(filename, layer)
     else:
-        write_file(output_filename, json_string)
+        write_json_file(output_filename, layer)
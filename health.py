@@ -1,86 +1,121 @@
+import atexit
+import json
 import os
-import pickle
 from difflib import SequenceMatcher
+from itertools import islice
 from constants import *
 
+# health state per YAML file, see _load_health_cache()
+_health_cache = None
+_health_cache_modified = False
+
+# error messages of the current health check, printed at once by _flush_error_msgs()
+_error_msgs = []
+
 
 def _print_error_msg(msg, print_error):
     if print_error:
-        print(msg)
+        _error_msgs.append(msg)
     return True
 
 
-def _update_health_state(current, update):
-    if current or update:
-        return True
-    else:
-        return update
+def _flush_error_msgs():
+    """
+    Print the collected error messages with a single write to stdout
+    :return:
+    """
+    if _error_msgs:
+        print('\n'.join(_error_msgs))
+        _error_msgs.clear()
 
 
-def _is_file_modified(filename):
+def _load_health_cache():
     """
-    Check if the provided file was modified since the last check
-    :param filename: file location
-    :return: true when modified else false
+    Get the health cache from disk. It is loaded only once per run and written back to disk at exit when changed.
+    :return: the health cache: {file path: {'mtime': ..., 'has_error': ...}}
     """
-    last_modified_file = 'cache/last-modified_' + os.path.basename(filename).rstrip('.yaml')
+    global _health_cache
 
-    def _update_modified_date(date):
-        with open(last_modified_file, 'wb') as fd:
-            pickle.dump(date, fd)
+    if _health_cache is None:
+        _health_cache = {}
+        if os.path.exists(HEALTH_CACHE_FILE):
+            try:
+                with open(HEALTH_CACHE_FILE, 'r') as f:
+                    _health_cache = json.load(f)
+            except ValueError:
+                # a corrupt cache file only results in all files being checked again
+                pass
+        atexit.register(_save_health_cache)
 
-    if not os.path.exists(last_modified_file):
-        last_modified = os.path.getmtime(filename)
-        _update_modified_date(last_modified)
+    return _health_cache
 
-        return True
-    else:
-        with open(last_modified_file, 'rb') as f:
-            last_modified_cache = pickle.load(f)
-            last_modified_current = os.path.getmtime(filename)
 
-            if last_modified_cache != last_modified_current:
-                _update_modified_date(last_modified_current)
-                return True
-            else:
-                return False
+def _save_health_cache():
+    """
+    Write the health cache to disk if changed
+    :return:
+    """
+    global _health_cache_modified
+
+    if _health_cache_modified:
+        if not os.path.exists('cache/'):
+            os.mkdir('cache/')
+        with open(HEALTH_CACHE_FILE, 'w') as f:
+            json.dump(_health_cache, f, separators=(',', ':'))
+        _health_cache_modified = False
 
 
-def _get_health_state_cache(filename):
+def _get_health_cache_entry(filename):
     """
-    Get file health state from disk
+    Get the health cache entry for the provided file
     :param filename: file location
-    :return: the cached error state
+    :return: the cache entry for this file
+    """
+    # the full path is used as key, so files with the same name in different folders do not share a cache entry
+    return _load_health_cache().setdefault(os.path.abspath(filename), {})
+
+
+def _update_health_cache_entry(cache_entry, key, value):
+    """
+    Update a value in a health cache entry if changed
+    :param cache_entry: the cache entry as returned by _get_health_cache_entry
+    :param key: the key within the cache entry
+    :param value: the new value
+    :return:
     """
-    last_error_file = 'cache/last-error-state_' + os.path.basename(filename).rstrip('.yaml')
+    global _health_cache_modified
 
-    if os.path.exists(last_error_file):
-        with open(last_error_file, 'rb') as f:
-            last_error_state_cache = pickle.load(f)
+    if key not in cache_entry or cache_entry[key] != value:
+        cache_entry[key] = value
+        _health_cache_modified = True
 
-        return last_error_state_cache
+
+def _is_file_modified(filename, cache_entry):
+    """
+    Check if the provided file was modified since the last check
+    :param filename: file location
+    :param cache_entry: the health cache entry of this file
+    :return: true when modified else false
+    """
+    last_modified_current = os.path.getmtime(filename)
+
+    if cache_entry.get('mtime') != last_modified_current:
+        _update_health_cache_entry(cache_entry, 'mtime', last_modified_current)
+        return True
+    else:
+        return False
 
 
 def _update_health_state_cache(filename, has_error):
     """
-    Write the file health state to disk if changed
+    Update the cached file health state
     :param filename: file location
+    :param has_error: the current error state
     """
     # the function 'check_health_data_sources' will call this function without providing a filename when
     # 'check_health_data_sources' is called from '_events_to_yaml' within 'eql_yaml.py'
     if filename:
-        last_error_file = 'cache/last-error-state_' + os.path.basename(filename).rstrip('.yaml')
-
-        def _update(error):
-            with open(last_error_file, 'wb') as fd:
-                pickle.dump(error, fd)
-
-        if not os.path.exists(last_error_file):
-            _update(has_error)
-        else:
-            error_state_cache = _get_health_state_cache(filename)
-            if error_state_cache != has_error:
-                _update(has_error)
+        _update_health_cache_entry(_get_health_cache_entry(filename), 'has_error', has_error)
 
 
 def _check_for_similar_values(values, values_key_name, health_is_called=False):
@@ -90,15 +125,31 @@ def _check_for_similar_values(values, values_key_name, health_is_called=False):
     :values_key_name: the kv-pair key name from which these values are originating
     :health_is_called: specify if an error message should be printed or not
     """
-    values_non_empty = [v for v in values if v is not None]
+    # identical values are never reported, so every unique pair of values needs to be compared at most once
+    values_non_empty = {v for v in values if v is not None}
     has_similar = False
     similar = set()
-    for i1 in values_non_empty:
-        for i2 in values_non_empty:
-            match_value = SequenceMatcher(None, i1, i2).ratio()
-            if match_value > 0.8 and match_value != 1:
-                similar.add(i1)
-                similar.add(i2)
+
+    # SequenceMatcher caches the analysis of its second sequence, so one matcher per value is created and reused
+    matchers = {v: SequenceMatcher(None, '', v) for v in values_non_empty}
+    values_sorted = sorted(values_non_empty, key=len)
+    for idx, i1 in enumerate(values_sorted):
+        for i2 in islice(values_sorted, idx + 1, None):
+            sm = matchers[i2]
+            sm.set_seq1(i1)
+            # real_quick_ratio() is an upper bound of ratio() that only depends on the lengths of both values. As the
+            # values are sorted on length, it will not exceed 0.8 for any of the remaining (longer) values either.
+            if sm.real_quick_ratio() <= 0.8:
+                break
+
+            # quick_ratio() is a cheap upper bound of ratio(), which skips most of the remaining pairs
+            if sm.quick_ratio() > 0.8:
+                # ratio() is not guaranteed to be symmetric, hence both directions are checked
+                sm_reverse = matchers[i1]
+                sm_reverse.set_seq1(i2)
+                if sm.ratio() > 0.8 or sm_reverse.ratio() > 0.8:
+                    similar.add(i1)
+                    similar.add(i2)
 
     if len(similar) > 0:
         has_similar = _print_error_msg(
@@ -119,59 +170,46 @@ def _check_health_score_object(yaml_object, object_type, tech_id, health_is_call
     :return: True if the YAML file is unhealthy, otherwise False
     """
     has_error = False
-    min_score = None
-    max_score = None
-
-    if object_type == 'detection':
-        min_score = -1
-        max_score = 5
-    elif object_type == 'visibility':
-        min_score = 0
-        max_score = 4
+    min_score, max_score = HEALTH_SCORE_RANGE[object_type]
 
     if not isinstance(yaml_object['score_logbook'], list):
         yaml_object['score_logbook'] = [yaml_object['score_logbook']]
 
     try:
         for score_obj in yaml_object['score_logbook']:
-            for key in ['date', 'score', 'comment']:
-                if key not in score_obj:
-                    has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' is MISSING a key-value pair in a ' +
-                                                 object_type + ' score object within the \'score_logbook\': ' + key, health_is_called)
-
-            if score_obj['score'] is None:
+            missing_keys = HEALTH_REQUIRED_KEYS_SCORE_OBJ - score_obj.keys()
+            if missing_keys:
+                has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' is MISSING a key-value pair in a ' + object_type +
+                                             ' score object within the \'score_logbook\': ' + ', '.join(sorted(missing_keys)), health_is_called)
+
+            score = score_obj['score']
+            score_is_int = isinstance(score, int)
+            if score is None:
                 has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' has an EMPTY key-value pair in a ' +
                                              object_type + ' score object within the \'score_logbook\': score', health_is_called)
 
-            elif not isinstance(score_obj['score'], int):
+            elif not score_is_int:
                 has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' has an INVALID score format in a ' + object_type +
-                                             ' score object within the \'score_logbook\': ' + score_obj['score'] + '  (should be an integer)', health_is_called)
+                                             ' score object within the \'score_logbook\': ' + str(score) + '  (should be an integer)', health_is_called)
 
-            if 'auto_generated' in score_obj:
-                if not isinstance(score_obj['auto_generated'], bool):
-                    has_error = _print_error_msg(
-                        '[!] Technique ID: ' + tech_id + ' has an INVALID \'auto_generated\' value in a ' + object_type + ' score object within the \'score_logbook\': should be set to \'true\' or \'false\'', health_is_called)
+            if 'auto_generated' in score_obj and not isinstance(score_obj['auto_generated'], bool):
+                has_error = _print_error_msg(
+                    '[!] Technique ID: ' + tech_id + ' has an INVALID \'auto_generated\' value in a ' + object_type + ' score object within the \'score_logbook\': should be set to \'true\' or \'false\'', health_is_called)
 
-            if isinstance(score_obj['score'], int):
-                if score_obj['date'] is None and ((score_obj['score'] > -1 and object_type == 'detection') or (score_obj['score'] > 0 and object_type == 'visibility')):
+            if score_is_int:
+                score_date = score_obj['date']
+                # a date is required for every score above the lowest possible score
+                if score_date is None and score > min_score:
                     has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' has an EMPTY key-value pair in a ' +
                                                  object_type + ' score object within the \'score_logbook\': date', health_is_called)
 
-                if not (score_obj['score'] >= min_score and score_obj['score'] <= max_score):
+                if not min_score <= score <= max_score:
                     has_error = _print_error_msg(
-                        '[!] Technique ID: ' + tech_id + ' has an INVALID ' + object_type + ' score in a score object within the \'score_logbook\': ' + str(score_obj['score']) + '  (should be between ' + str(min_score) + ' and ' + str(max_score) + ')', health_is_called)
-
-                if not score_obj['date'] is None:
-                    try:
-                        # pylint: disable=pointless-statement
-                        score_obj['date'].year
-                        # pylint: disable=pointless-statement
-                        score_obj['date'].month
-                        # pylint: disable=pointless-statement
-                        score_obj['date'].day
-                    except AttributeError:
-                        has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' has an INVALID data format in a ' + object_type +
-                                                     ' score object within the \'score_logbook\': ' + score_obj['date'] + '  (should be YYYY-MM-DD without quotes)', health_is_called)
+                        '[!] Technique ID: ' + tech_id + ' has an INVALID ' + object_type + ' score in a score object within the \'score_logbook\': ' + str(score) + '  (should be between ' + str(min_score) + ' and ' + str(max_score) + ')', health_is_called)
+
+                if score_date is not None and not all(hasattr(score_date, a) for a in ('year', 'month', 'day')):
+                    has_error = _print_error_msg('[!] Technique ID: ' + tech_id + ' has an INVALID data format in a ' + object_type +
+                                                 ' score object within the \'score_logbook\': ' + str(score_date) + '  (should be YYYY-MM-DD without quotes)', health_is_called)
     except KeyError:
         pass
 
@@ -212,22 +250,22 @@ def _check_health_techniques(filename, technique_content, health_is_called):
                     'file: %s (should be value(s) of: [%s] or all)' % (p, ', '.join(list(supported_platforms.values()))),
                     health_is_called)
 
-    # create a list of ATT&CK technique IDs and check for duplicates
-    tech_ids = list(map(lambda x: x['technique_id'], technique_content['techniques']))
+    # check for duplicate ATT&CK technique IDs
     tech_dup = set()
-    for tech in tech_ids:
+    for tech in (t['technique_id'] for t in technique_content['techniques']):
         if tech not in tech_dup:
             tech_dup.add(tech)
+
+            # check if the technique has a valid format (once per unique technique ID)
+            if not REGEX_YAML_TECHNIQUE_ID_FORMAT.match(tech):
+                has_error = _print_error_msg('[!] Invalid technique ID: ' + tech, health_is_called)
         else:
             has_error = _print_error_msg('[!] Duplicate technique ID: ' + tech, health_is_called)
 
-        # check if the technique has a valid format
-        if not REGEX_YAML_TECHNIQUE_ID_FORMAT.match(tech):
-            has_error = _print_error_msg('[!] Invalid technique ID: ' + tech, health_is_called)
-
     all_applicable_to = set()
 
-    techniques = load_techniques(filename)
+    # the content is already loaded for this check, so there is no need to load the file again
+    techniques = load_techniques(technique_content)
     for tech, v in techniques[0].items():
         for obj_type in ['detection', 'visibility']:
             if obj_type not in v:
@@ -235,18 +273,16 @@ def _check_health_techniques(filename, technique_content, health_is_called):
             else:
                 obj_applicable_to = []
                 for obj in v[obj_type]:
-                    obj_keys = ['applicable_to', 'comment', 'score_logbook']
                     obj_keys_list = ['applicable_to']
                     obj_keys_not_none = ['applicable_to']
                     if obj_type == 'detection':
-                        obj_keys.append('location')
                         obj_keys_list.append('location')
                         obj_keys_not_none.append('location')
 
-                    for okey in obj_keys:
-                        if okey not in obj:
-                            has_error = _print_error_msg('[!] Technique ID: ' + tech +
-                                                         ' is MISSING a key-value pair in \'' + obj_type + '\': ' + okey, health_is_called)
+                    missing_keys = HEALTH_REQUIRED_KEYS_TECHNIQUE_OBJ[obj_type] - obj.keys()
+                    if missing_keys:
+                        has_error = _print_error_msg('[!] Technique ID: ' + tech + ' is MISSING a key-value pair in \'' + obj_type + '\': ' +
+                                                     ', '.join(sorted(missing_keys)), health_is_called)
 
                     for okey in obj_keys_list:
                         if okey in obj:
@@ -267,8 +303,7 @@ def _check_health_techniques(filename, technique_content, health_is_called):
                                 has_error = _print_error_msg('[!] Technique ID: ' + tech + ' the key-value pair \'' + okey + '\' in \'' + obj_type +
                                                              '\' has multiple EMPTY values  (an empty string is allowed: \'\')', health_is_called)
 
-                    health = _check_health_score_object(obj, obj_type, tech, health_is_called)
-                    has_error = _update_health_state(has_error, health)
+                    has_error = _check_health_score_object(obj, obj_type, tech, health_is_called) or has_error
 
                     if 'applicable_to' in obj and isinstance(obj['applicable_to'], list):
                         all_applicable_to.update(obj['applicable_to'])
@@ -363,15 +398,13 @@ def check_health_data_sources(filename, ds_content, health_is_called, no_print=F
 
             glb_obj_applicable_to = []
             for ds_details_obj in ds_global_obj['data_source']:
-                obk_keys = ['applicable_to', 'date_registered', 'date_connected',
-                            'products', 'available_for_data_analytics', 'comment', 'data_quality']
                 obj_keys_list = ['applicable_to', 'products']
                 obj_keys_not_none = ['applicable_to', 'products']
 
-                for okey in obk_keys:
-                    if okey not in ds_details_obj:
-                        has_error = _print_error_msg('[!] Data source: \'' + ds_global_obj['data_source_name'] +
-                                                     '\' is MISSING a key-value pair: ' + okey, health_is_called)
+                missing_keys = HEALTH_REQUIRED_KEYS_DATA_SOURCE_OBJ - ds_details_obj.keys()
+                if missing_keys:
+                    has_error = _print_error_msg('[!] Data source: \'' + ds_global_obj['data_source_name'] +
+                                                 '\' is MISSING a key-value pair: ' + ', '.join(sorted(missing_keys)), health_is_called)
 
                 for okey in obj_keys_list:
                     if okey in ds_details_obj:
@@ -497,21 +530,24 @@ def check_yaml_file_health(filename, file_type, health_is_called):
     :param health_is_called: boolean that specifies if detailed errors in the file will be printed to stdout
     :return:
     """
-    from generic import init_yaml
+    from generic import load_yaml_file
+
+    cache_entry = _get_health_cache_entry(filename)
 
     # first we check if the file was modified. Otherwise, the health check is skipped for performance reasons
-    if _is_file_modified(filename) or health_is_called:
+    if _is_file_modified(filename, cache_entry) or health_is_called:
 
-        _yaml = init_yaml()
-        with open(filename, 'r') as yaml_file:
-            yaml_content = _yaml.load(yaml_file)
+        yaml_content = load_yaml_file(filename)
 
-        if file_type == FILE_TYPE_DATA_SOURCE_ADMINISTRATION:
-            check_health_data_sources(filename, yaml_content, health_is_called)
-        elif file_type == FILE_TYPE_TECHNIQUE_ADMINISTRATION:
-            _check_health_techniques(filename, yaml_content, health_is_called)
-        elif file_type == FILE_TYPE_GROUP_ADMINISTRATION:
-            _check_health_group(filename, yaml_content, health_is_called)
+        try:
+            if file_type == FILE_TYPE_DATA_SOURCE_ADMINISTRATION:
+                check_health_data_sources(filename, yaml_content, health_is_called)
+            elif file_type == FILE_TYPE_TECHNIQUE_ADMINISTRATION:
+                _check_health_techniques(filename, yaml_content, health_is_called)
+            elif file_type == FILE_TYPE_GROUP_ADMINISTRATION:
+                _check_health_group(filename, yaml_content, health_is_called)
+        finally:
+            _flush_error_msgs()
 
-    elif _get_health_state_cache(filename):
+    elif cache_entry.get('has_error'):
         print(HEALTH_ERROR_TXT + filename)
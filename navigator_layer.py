@@ -1,5 +1,69 @@
 from constants import *
 
+# The legend items of the Navigator layers per layer type. These lists are shared between layers, as they are not modified.
+_LEGEND_ITEMS = {
+    'groups_detection_overlay': [
+        {'label': 'Tech. in group/campaign + detection score 0: Forensics/Context', 'color': COLOR_O_0},
+        {'label': 'Tech. in group/campaign + detection score 1: Basic', 'color': COLOR_O_1},
+        {'label': 'Tech. in group/campaign + detection score 2: Fair', 'color': COLOR_O_2},
+        {'label': 'Tech. in group/campaign + detection score 3: Good', 'color': COLOR_O_3},
+        {'label': 'Tech. in group/campaign + detection score 4: Very good', 'color': COLOR_O_4},
+        {'label': 'Tech. in group/campaign + detection score 5: Excellent', 'color': COLOR_O_5},
+        {'label': 'Tech. in detection, score 0: Forensics/Context', 'color': COLOR_D_0},
+        {'label': 'Tech. in detection, score 1: Basic', 'color': COLOR_D_1},
+        {'label': 'Tech. in detection, score 2: Fair', 'color': COLOR_D_2},
+        {'label': 'Tech. in detection, score 3: Good', 'color': COLOR_D_3},
+        {'label': 'Tech. in detection, score 4: Very good', 'color': COLOR_D_4},
+        {'label': 'Tech. in detection, score 5: Excellent', 'color': COLOR_D_5}
+    ],
+    'groups_visibility_overlay': [
+        {'label': 'Tech. in group/campaign + visibility score 1: Minimal', 'color': COLOR_O_1},
+        {'label': 'Tech. in group/campaign + visibility score 2: Medium', 'color': COLOR_O_2},
+        {'label': 'Tech. in group/campaign + visibility score 3: Good', 'color': COLOR_O_3},
+        {'label': 'Tech. in group/campaign + visibility score 4: Excellent', 'color': COLOR_O_4},
+        {'label': 'Tech. in visibility, score 1: Minimal', 'color': COLOR_V_1},
+        {'label': 'Tech. in visibility, score 2: Medium', 'color': COLOR_V_2},
+        {'label': 'Tech. in visibility, score 3: Good', 'color': COLOR_V_3},
+        {'label': 'Tech. in visibility, score 4: Excellent', 'color': COLOR_V_4}
+    ],
+    'detections': [
+        {'label': 'Detection score 0: Forensics/Context', 'color': COLOR_D_0},
+        {'label': 'Detection score 1: Basic', 'color': COLOR_D_1},
+        {'label': 'Detection score 2: Fair', 'color': COLOR_D_2},
+        {'label': 'Detection score 3: Good', 'color': COLOR_D_3},
+        {'label': 'Detection score 4: Very good', 'color': COLOR_D_4},
+        {'label': 'Detection score 5: Excellent', 'color': COLOR_D_5}
+    ],
+    'data_sources': [
+        {'label': '1-25% of data sources available', 'color': COLOR_DS_25p},
+        {'label': '26-50% of data sources available', 'color': COLOR_DS_50p},
+        {'label': '51-75% of data sources available', 'color': COLOR_DS_75p},
+        {'label': '76-99% of data sources available', 'color': COLOR_DS_99p},
+        {'label': '100% of data sources available', 'color': COLOR_DS_100p}
+    ],
+    'visibility': [
+        {'label': 'Visibility score 1: Minimal', 'color': COLOR_V_1},
+        {'label': 'Visibility score 2: Medium', 'color': COLOR_V_2},
+        {'label': 'Visibility score 3: Good', 'color': COLOR_V_3},
+        {'label': 'Visibility score 4: Excellent', 'color': COLOR_V_4}
+    ],
+    'layered': [
+        {'label': 'Visibility and detection', 'color': COLOR_OVERLAY_BOTH},
+        {'label': 'Visibility score 1: Minimal', 'color': COLOR_V_1},
+        {'label': 'Visibility score 2: Medium', 'color': COLOR_V_2},
+        {'label': 'Visibility score 3: Good', 'color': COLOR_V_3},
+        {'label': 'Visibility score 4: Excellent', 'color': COLOR_V_4},
+        {'label': 'Detection score 1: Basic', 'color': COLOR_D_1},
+        {'label': 'Detection score 2: Fair', 'color': COLOR_D_2},
+        {'label': 'Detection score 3: Good', 'color': COLOR_D_3},
+        {'label': 'Detection score 4: Very good', 'color': COLOR_D_4},
+        {'label': 'Detection score 5: Excellent', 'color': COLOR_D_5}
+    ]
+}
+
+# gradient for layers in which the colors are set per technique
+_GRADIENT_DISABLED = {'colors': [COLOR_GRADIENT_DISABLE, COLOR_GRADIENT_DISABLE], 'minValue': 0, 'maxValue': 10000}
+
 
 def _get_base_template(name, description, platform, sorting, domain, layer_settings):
     """
@@ -109,31 +173,32 @@ def get_layer_template_groups(name, max_count, description, platform, overlay_ty
         layer['legendItems'].append({'label': 'Src. of tech. is only software', 'color': COLOR_SOFTWARE})
         layer['legendItems'].append({'label': 'Src. of tech. is group/campaign/overlay + software', 'color': COLOR_GROUP_AND_SOFTWARE})
     elif overlay_type == OVERLAY_TYPE_DETECTION:
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + detection score 0: Forensics/Context', 'color': COLOR_O_0})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + detection score 1: Basic', 'color': COLOR_O_1})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + detection score 2: Fair', 'color': COLOR_O_2})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + detection score 3: Good', 'color': COLOR_O_3})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + detection score 4: Very good', 'color': COLOR_O_4})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + detection score 5: Excellent', 'color': COLOR_O_5})
-        layer['legendItems'].append({'label': 'Tech. in detection, score 0: Forensics/Context', 'color': COLOR_D_0})
-        layer['legendItems'].append({'label': 'Tech. in detection, score 1: Basic', 'color': COLOR_D_1})
-        layer['legendItems'].append({'label': 'Tech. in detection, score 2: Fair', 'color': COLOR_D_2})
-        layer['legendItems'].append({'label': 'Tech. in detection, score 3: Good', 'color': COLOR_D_3})
-        layer['legendItems'].append({'label': 'Tech. in detection, score 4: Very good', 'color': COLOR_D_4})
-        layer['legendItems'].append({'label': 'Tech. in detection, score 5: Excellent', 'color': COLOR_D_5})
+        layer['legendItems'].extend(_LEGEND_ITEMS['groups_detection_overlay'])
     elif overlay_type == OVERLAY_TYPE_VISIBILITY:
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + visibility score 1: Minimal', 'color': COLOR_O_1})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + visibility score 2: Medium', 'color': COLOR_O_2})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + visibility score 3: Good', 'color': COLOR_O_3})
-        layer['legendItems'].append({'label': 'Tech. in group/campaign + visibility score 4: Excellent', 'color': COLOR_O_4})
-        layer['legendItems'].append({'label': 'Tech. in visibility, score 1: Minimal', 'color': COLOR_V_1})
-        layer['legendItems'].append({'label': 'Tech. in visibility, score 2: Medium', 'color': COLOR_V_2})
-        layer['legendItems'].append({'label': 'Tech. in visibility, score 3: Good', 'color': COLOR_V_3})
-        layer['legendItems'].append({'label': 'Tech. in visibility, score 4: Excellent', 'color': COLOR_V_4})
+        layer['legendItems'].extend(_LEGEND_ITEMS['groups_visibility_overlay'])
 
     return layer
 
 
+def _get_layer_template(layer_type, name, description, platform, domain, layer_settings, gradient=None):
+    """
+    Prepares a template for the json layer file with the legend of the provided layer type
+    :param layer_type: the layer type, which is a key in _LEGEND_ITEMS
+    :param name: name
+    :param description: description
+    :param platform: platform
+    :param domain: the specified domain
+    :param layer_settings: settings for the Navigator layer
+    :param gradient: optional gradient for the layer
+    :return: layer template dictionary
+    """
+    layer = _get_base_template(name, description, platform, 0, domain, layer_settings)
+    if gradient:
+        layer['gradient'] = dict(gradient, colors=list(gradient['colors']))
+    layer['legendItems'] = list(_LEGEND_ITEMS[layer_type])
+    return layer
+
+
 def get_layer_template_detections(name, description, platform, domain, layer_settings):
     """
     Prepares a base template for the json layer file that can be loaded into the MITRE ATT&CK Navigator.
@@ -145,18 +210,7 @@ def get_layer_template_detections(name, description, platform, domain, layer_set
     :param layer_settings: settings for the Navigator layer
     :return: layer template dictionary
     """
-    layer = _get_base_template(name, description, platform, 0, domain, layer_settings)
-    layer['gradient'] = {'colors': [COLOR_GRADIENT_DISABLE, COLOR_GRADIENT_DISABLE], 'minValue': 0, 'maxValue': 10000}
-    layer['legendItems'] = \
-        [
-            {'label': 'Detection score 0: Forensics/Context', 'color': COLOR_D_0},
-            {'label': 'Detection score 1: Basic', 'color': COLOR_D_1},
-            {'label': 'Detection score 2: Fair', 'color': COLOR_D_2},
-            {'label': 'Detection score 3: Good', 'color': COLOR_D_3},
-            {'label': 'Detection score 4: Very good', 'color': COLOR_D_4},
-            {'label': 'Detection score 5: Excellent', 'color': COLOR_D_5}
-    ]
-    return layer
+    return _get_layer_template('detections', name, description, platform, domain, layer_settings, _GRADIENT_DISABLED)
 
 
 def get_layer_template_data_sources(name, description, platform, domain, layer_settings):
@@ -170,16 +224,7 @@ def get_layer_template_data_sources(name, description, platform, domain, layer_s
     :param layer_settings: settings for the Navigator layer
     :return: layer template dictionary
     """
-    layer = _get_base_template(name, description, platform, 0, domain, layer_settings)
-    layer['legendItems'] = \
-        [
-            {'label': '1-25% of data sources available', 'color': COLOR_DS_25p},
-            {'label': '26-50% of data sources available', 'color': COLOR_DS_50p},
-            {'label': '51-75% of data sources available', 'color': COLOR_DS_75p},
-            {'label': '76-99% of data sources available', 'color': COLOR_DS_99p},
-            {'label': '100% of data sources available', 'color': COLOR_DS_100p}
-    ]
-    return layer
+    return _get_layer_template('data_sources', name, description, platform, domain, layer_settings)
 
 
 def get_layer_template_visibility(name, description, platform, domain, layer_settings):
@@ -193,16 +238,7 @@ def get_layer_template_visibility(name, description, platform, domain, layer_set
     :param layer_settings: settings for the Navigator layer
     :return: layer template dictionary
     """
-    layer = _get_base_template(name, description, platform, 0, domain, layer_settings)
-    layer['gradient'] = {'colors': [COLOR_GRADIENT_DISABLE, COLOR_GRADIENT_DISABLE], 'minValue': 0, 'maxValue': 10000}
-    layer['legendItems'] = \
-        [
-            {'label': 'Visibility score 1: Minimal', 'color': COLOR_V_1},
-            {'label': 'Visibility score 2: Medium', 'color': COLOR_V_2},
-            {'label': 'Visibility score 3: Good', 'color': COLOR_V_3},
-            {'label': 'Visibility score 4: Excellent', 'color': COLOR_V_4}
-    ]
-    return layer
+    return _get_layer_template('visibility', name, description, platform, domain, layer_settings, _GRADIENT_DISABLED)
 
 
 def get_layer_template_layered(name, description, platform, domain, layer_settings):
@@ -216,21 +252,7 @@ def get_layer_template_layered(name, description, platform, domain, layer_settin
     :param layer_settings: settings for the Navigator layer
     :return: layer template dictionary
     """
-    layer = _get_base_template(name, description, platform, 0, domain, layer_settings)
-    layer['legendItems'] = \
-        [
-            {'label': 'Visibility and detection', 'color': COLOR_OVERLAY_BOTH},
-            {'label': 'Visibility score 1: Minimal', 'color': COLOR_V_1},
-            {'label': 'Visibility score 2: Medium', 'color': COLOR_V_2},
-            {'label': 'Visibility score 3: Good', 'color': COLOR_V_3},
-            {'label': 'Visibility score 4: Excellent', 'color': COLOR_V_4},
-            {'label': 'Detection score 1: Basic', 'color': COLOR_D_1},
-            {'label': 'Detection score 2: Fair', 'color': COLOR_D_2},
-            {'label': 'Detection score 3: Good', 'color': COLOR_D_3},
-            {'label': 'Detection score 4: Very good', 'color': COLOR_D_4},
-            {'label': 'Detection score 5: Excellent', 'color': COLOR_D_5}
-    ]
-    return layer
+    return _get_layer_template('layered', name, description, platform, domain, layer_settings)
 
 
 def make_layer_metadata_compliant(metadata):
@@ -262,7 +284,7 @@ def add_metadata_technique_object(technique, obj_type, metadata, count_detection
         raise Exception("Invalid value for 'obj_type' provided.")
 
     metadata.append({'divider': True})
-    metadata.append({'name': 'Applicable to', 'value': ', '.join(set([a for v in technique[obj_type] for a in v['applicable_to']]))})  # noqa
+    metadata.append({'name': 'Applicable to', 'value': ', '.join({a for entry in technique[obj_type] for a in entry.get('applicable_to', ())})})  # noqa
     metadata.append({'name': '' + obj_type.capitalize() + ' score', 'value': ', '.join([str(calculate_score(technique[obj_type]))])})  # noqa
     if obj_type == 'detection':
         location = ''
@@ -284,7 +306,7 @@ def add_metadata_technique_object(technique, obj_type, metadata, count_detection
             for l, c in location_count.items():
                 location += f"{l}: {c}. "
         else:
-            location = ', '.join(set([a for v in technique[obj_type] for a in v['location']]))
+            location = ', '.join({l for entry in technique[obj_type] for l in entry.get('location', ())})
         metadata.append({'name': '' + obj_type.capitalize() + ' location', 'value': location})  # noqa
     metadata.append({'name': '' + obj_type.capitalize() + ' comment', 'value': ' | '.join(set(filter(lambda x: x != '', map(lambda k: k['comment'], technique[obj_type]))))})  # noqa
     metadata.append({'name': '' + obj_type.capitalize() + ' score comment', 'value': ' | '.join(set(filter(lambda x: x != '', map(lambda i: get_latest_comment(i), technique[obj_type]))))})  # noqa
@@ -1,4 +1,3 @@
-import simplejson
 import xlsxwriter
 from datetime import datetime
 from generic import *
@@ -38,7 +37,6 @@ def _write_layer(layer, mapped_techniques, filename_prefix, name, output_filenam
     :return:
     """
     layer['techniques'] = mapped_techniques
-    json_string = simplejson.dumps(layer).replace('}, ', '},\n')
     if not output_filename:
         output_filename = create_output_filename(filename_prefix, name)
     else:
@@ -46,7 +44,7 @@ def _write_layer(layer, mapped_techniques, filename_prefix, name, output_filenam
             output_filename = output_filename.replace('.json', '')
         if filename_prefix == 'visibility_and_detection':
             output_filename += '_overlay'
-    write_file(output_filename, json_string)
+    write_json_file(output_filename, layer)
 
 
 def _map_and_colorize_techniques_for_detections(my_techniques, domain, count_detections, layer_settings):
@@ -88,7 +86,7 @@ def _map_and_colorize_techniques_for_detections(my_techniques, domain, count_det
                         cnt = 1
                         tcnt = len([d for d in technique_data['detection'] if get_latest_score(d) >= 0])
                         for detection in technique_data['detection']:
-                            d_score = get_latest_score(detection)
+                            d_score, _, d_comment, _ = get_latest_score_values(detection)
                             if d_score >= 0:
                                 location = ''
                                 if count_detections:
@@ -104,7 +102,7 @@ def _map_and_colorize_techniques_for_detections(my_techniques, domain, count_det
                                 x['metadata'].append({'name': 'Detection score', 'value': str(d_score)})
                                 x['metadata'].append({'name': 'Detection location', 'value': location})
                                 x['metadata'].append({'name': 'Technique comment', 'value': detection['comment']})
-                                x['metadata'].append({'name': 'Detection comment', 'value': get_latest_comment(detection)})
+                                x['metadata'].append({'name': 'Detection comment', 'value': d_comment})
                                 if cnt != tcnt:
                                     x['metadata'].append({'divider': True})
                                 cnt += 1
@@ -166,11 +164,12 @@ def _map_and_colorize_techniques_for_visibility(my_techniques, platforms, domain
                 cnt = 1
                 tcnt = len(technique_data['visibility'])
                 for visibility in technique_data['visibility']:
+                    v_score, _, v_comment, _ = get_latest_score_values(visibility)
                     applicable_to = ', '.join(visibility['applicable_to'])
                     x['metadata'].append({'name': 'Applicable to', 'value': applicable_to})
-                    x['metadata'].append({'name': 'Visibility score', 'value': str(get_latest_score(visibility))})
+                    x['metadata'].append({'name': 'Visibility score', 'value': str(v_score)})
                     x['metadata'].append({'name': 'Technique comment', 'value': visibility['comment']})
-                    x['metadata'].append({'name': 'Visibility comment', 'value': get_latest_comment(visibility)})
+                    x['metadata'].append({'name': 'Visibility comment', 'value': v_comment})
                     if cnt != tcnt:
                         x['metadata'].append({'divider': True})
                     cnt += 1
@@ -350,8 +349,7 @@ def plot_graph(filename, type_graph, output_filename):
     graph_values = []
     for t in my_techniques.values():
         for item in t[type_graph]:
-            date = get_latest_date(item)
-            score = get_latest_score(item)
+            score, date, _, _ = get_latest_score_values(item)
             if date and score > 0:
                 yyyymmdd = date.strftime('%Y-%m-%d')
                 graph_values.append({'date': yyyymmdd, 'count': 1})
@@ -487,16 +485,14 @@ def export_techniques_list_to_excel(filename, output_filename):
                                            valign_top)
                 worksheet_detections.write(dy, 3, ', '.join(detection['applicable_to']), wrap_text)
                 # make sure the date format is '%Y-%m-%d'. When we've done a EQL query this will become '%Y-%m-%d %H %M $%S'
-                tmp_date = get_latest_date(detection)
+                ds, tmp_date, d_comment, _ = get_latest_score_values(detection)
                 if isinstance(tmp_date, datetime):
                     tmp_date = tmp_date.strftime('%Y-%m-%d')
                 worksheet_detections.write(dy, 4, str(tmp_date).replace('None', ''), valign_top)
-                ds = get_latest_score(detection)
                 worksheet_detections.write(dy, 5, ds, detection_score_0 if ds == 0 else detection_score_1 if ds == 1 else detection_score_2 if ds == 2 else detection_score_3 if ds == 3 else detection_score_4 if ds == 4 else detection_score_5 if ds == 5 else no_score)  # noqa
                 worksheet_detections.write(dy, 6, '\n'.join(detection['location']), wrap_text)
                 worksheet_detections.write(dy, 7, detection['comment'][:-1]
                                            if detection['comment'].endswith('\n') else detection['comment'], wrap_text)
-                d_comment = get_latest_comment(detection)
                 worksheet_detections.write(dy, 8, d_comment[:-1] if d_comment.endswith('\n') else d_comment, wrap_text)
                 dy += 1
             else:
@@ -516,13 +512,11 @@ def export_techniques_list_to_excel(filename, output_filename):
                                                             get_tactics(technique)), valign_top)
                 worksheet_visibility.write(vy, 3, ', '.join(visibility['applicable_to']), wrap_text)
                 # make sure the date format is '%Y-%m-%d'. When we've done a EQL query this will become '%Y-%m-%d %H %M $%S'
-                tmp_date = get_latest_date(visibility)
+                vs, tmp_date, v_comment, _ = get_latest_score_values(visibility)
                 if isinstance(tmp_date, datetime):
                     tmp_date = tmp_date.strftime('%Y-%m-%d')
                 worksheet_visibility.write(vy, 4, str(tmp_date).replace('None', ''), valign_top)
-                vs = get_latest_score(visibility)
                 worksheet_visibility.write(vy, 5, vs, visibility_score_1 if vs == 1 else visibility_score_2 if vs == 2 else visibility_score_3 if vs == 3 else visibility_score_4 if vs == 4 else no_score)  # noqa
-                v_comment = get_latest_comment(visibility)
                 worksheet_visibility.write(vy, 6, visibility['comment'][:-1]
                                            if visibility['comment'].endswith('\n') else visibility['comment'], wrap_text)
                 worksheet_visibility.write(vy, 7, v_comment[:-1] if v_comment.endswith('\n') else v_comment, wrap_text)